@@ -0,0 +1,168 @@
+import mmap, os, re
+import numpy as np
+
+
+CHAPTER_PATTERN = r"CHAPTER [IVXLC]+"
+MIN_PARAGRAPH_CHARS = 30
+TOKENS_PER_CHUNK = 100
+
+
+# ========== 1. Memory-mapped text ==========
+class MappedBook:
+    """
+    Read-only memory map of a UTF-8 book that can be sliced by *character*
+    offsets. The book is almost pure ASCII, so only the positions of the few
+    multi-byte characters are kept to translate characters to bytes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        raw = np.frombuffer(self._mm, dtype=np.uint8)
+        # UTF-8 continuation bytes are 10xxxxxx; each one is an extra byte
+        # on top of the character it belongs to.
+        continuation = np.flatnonzero((raw & 0xC0) == 0x80)
+        del raw
+        # first character offset that has each extra byte in front of it
+        self._extra_at = continuation - np.arange(len(continuation))
+        self.n_chars = len(self._mm) - len(continuation)
+
+    def char_to_byte(self, char_offset):
+        extra = np.searchsorted(self._extra_at, char_offset, side="right")
+        return int(char_offset + extra)
+
+    def slice(self, start_char, end_char):
+        start = self.char_to_byte(start_char)
+        end = self.char_to_byte(end_char)
+        return self._mm[start:end].decode("utf-8")
+
+    def read(self):
+        return self._mm[:].decode("utf-8")
+
+    def close(self):
+        self._mm.close()
+
+
+# ========== 2. Book store ==========
+class BookStore:
+    """
+    A book on disk plus a persisted offset index (<book>.index.npz) of
+    chapter, paragraph and sentence [start, end) character offsets.
+    Segmentation is then a lookup in the index and a slice of the memory map
+    instead of re.split / str.split over a fresh copy of the whole book.
+    Chapters split on CHAPTER headings, paragraphs are lines longer than
+    MIN_PARAGRAPH_CHARS; sentence offsets need one spaCy parse, the first time they are asked for.
+    """
+
+    def __init__(self, path="clean_book.txt", index_path=None):
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + ".index.npz"
+        self.book = MappedBook(path)
+        self.index = self._load_index()
+        if self.index is None:
+            self.index = self._build_index()
+            self._save_index()
+
+    # ---------- index persistence ----------
+    def _source_stamp(self):
+        stat = os.stat(self.path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return None
+        with np.load(self.index_path) as data:
+            index = {key: data[key] for key in data.files}
+        if not np.array_equal(index.get("source"), self._source_stamp()):
+            print(f"{self.path} changed since {self.index_path} was built; rebuilding")
+            return None
+        return index
+
+    def _save_index(self):
+        np.savez(self.index_path, source=self._source_stamp(), **{
+            k: v for k, v in self.index.items() if k != "source"
+        })
+
+    def _build_index(self):
+        print(f"Building offset index for {self.path}...")
+        text = self.book.read()
+        headings = [(m.start(), m.end()) for m in re.finditer(CHAPTER_PATTERN, text)]
+        chapter_starts = [0] + [end for _, end in headings]
+        chapter_ends = [start for start, _ in headings] + [len(text)]
+
+        paragraphs = [(m.start(), m.end()) for m in re.finditer(r"[^\n]+", text)
+                      if len(m.group().strip()) > MIN_PARAGRAPH_CHARS]
+
+        return {
+            "chapter": np.array([chapter_starts, chapter_ends], dtype=np.int64),
+            "paragraph": np.array(paragraphs, dtype=np.int64).reshape(-1, 2).T,
+        }
+
+    def ensure_sentences(self, nlp):
+        """Parse once to find sentence boundaries, then keep them in the index."""
+        if "sentence" in self.index:
+            return
+        print(f"Indexing sentences of {self.path} (one-off parse)...")
+        text = self.book.read()
+        keep = {"tok2vec", "parser", "senter"}
+        with nlp.select_pipes(disable=[p for p in nlp.pipe_names if p not in keep]):
+            doc = nlp(text)
+        sents = list(doc.sents)
+        self.index["sentence"] = np.array(
+            [[s.start_char for s in sents], [s.end_char for s in sents]], dtype=np.int64
+        )
+        # whitespace-separated word counts, used for the 100-token buckets
+        self.index["sentence_words"] = np.array(
+            [len(s.text.split()) for s in sents], dtype=np.int64
+        )
+        self._save_index()
+
+    # ---------- segmentation ----------
+    def bounds(self, by, nlp=None):
+        """(starts, ends) int arrays of character offsets for a segmentation mode."""
+        if by in ("chapter", "paragraph"):
+            starts, ends = self.index[by]
+            return starts, ends
+        if by in ("sentence", "100token"):
+            if nlp is not None:
+                self.ensure_sentences(nlp)
+            if "sentence" not in self.index:
+                raise ValueError(f"{by} bounds need an nlp object the first time")
+            starts, ends = self.index["sentence"]
+            if by == "sentence":
+                return starts, ends
+            return self._token_buckets(starts, ends, self.index["sentence_words"])
+        return np.array([0]), np.array([self.book.n_chars])
+
+    @staticmethod
+    def _token_buckets(starts, ends, words):
+        # close a bucket on the sentence that brings it to >= 100 words
+        bucket_starts, bucket_ends, first, count = [], [], None, 0
+        for start, end, n in zip(starts, ends, words):
+            first = start if first is None else first
+            count += n
+            if count >= TOKENS_PER_CHUNK:
+                bucket_starts.append(first)
+                bucket_ends.append(end)
+                first, count = None, 0
+        if first is not None:
+            bucket_starts.append(first)
+            bucket_ends.append(ends[-1])
+        return np.array(bucket_starts, dtype=np.int64), np.array(bucket_ends, dtype=np.int64)
+
+    def chunks(self, by, nlp=None):
+        """(start_char, text) pairs; every text is an exact slice of the book."""
+        starts, ends = self.bounds(by, nlp)
+        return [(int(s), self.book.slice(s, e)) for s, e in zip(starts, ends)]
+
+    def locate(self, by, char_offsets, nlp=None):
+        """Index of the segment that contains each character offset (-1 if none)."""
+        starts, ends = self.bounds(by, nlp)
+        offsets = np.asarray(char_offsets)
+        idx = np.searchsorted(starts, offsets, side="right") - 1
+        inside = (idx >= 0) & (offsets < ends[np.clip(idx, 0, None)])
+        return np.where(inside, idx, -1)
+
+    def slice(self, start_char, end_char):
+        return self.book.slice(start_char, end_char)
@@ -0,0 +1,279 @@
+import csv, math, re
+from functools import lru_cache
+
+import numpy as np
+import spacy
+from spacy.tokens import Span
+from spacy.matcher import Matcher
+
+
+KB_PATH = "characters_updated.csv"
+
+TITLE = ["Mr", "Mr.", "Mrs", "Mrs.", "Miss", "Ms", "Lady", "Sir",
+         "Colonel", "Capt", "Captain", "Lord", "Rev", "General"]
+
+
+# ======================================================
+# 0. 规则：强制合并 “Mr. Bennet” → PERSON 实体
+# ======================================================
+@lru_cache(maxsize=None)
+def _title_matcher(vocab):
+    matcher = Matcher(vocab)
+    matcher.add("TITLE_NAME", [[
+        {"TEXT": {"IN": TITLE}},
+        {"IS_ALPHA": True, "OP": "+"}
+    ]])
+    return matcher
+
+
+def merge_titles(doc):
+
+    matches = _title_matcher(doc.vocab)(doc)
+
+    new_spans = []
+
+    for _, start, end in matches:
+        # 创建新的 PERSON span
+        span = Span(doc, start, end, label="PERSON")
+        new_spans.append(span)
+
+    # *** 关键：合并成一个列表后去重叠 ***
+    all_spans = list(doc.ents) + new_spans
+    all_spans = spacy.util.filter_spans(all_spans)   # <- ⭐ 必须在这里过滤
+
+    doc.ents = all_spans
+    return doc
+
+
+# ======================================================
+# 工具：生成 Bennet’s / Collins’
+# ======================================================
+def make_possessive(name):
+    return name + "’" if name.endswith("s") else name + "’s"
+
+
+# ======================================================
+# 1. 知识库：别名 → QID, 性别
+# ======================================================
+UNKNOWN, MALE, FEMALE = 0, 1, 2
+GENDER_CODES = {"M": MALE, "F": FEMALE}
+TITLE_GENDER = {
+    "mr": MALE, "sir": MALE, "lord": MALE, "colonel": MALE, "capt": MALE,
+    "captain": MALE, "general": MALE, "rev": MALE,
+    "mrs": FEMALE, "miss": FEMALE, "ms": FEMALE, "lady": FEMALE,
+}
+
+# pronoun → (gender, role); role decides the replacement form
+PRONOUNS = {
+    "he": (MALE, "name"), "him": (MALE, "name"), "his": (MALE, "possessive"),
+    "she": (FEMALE, "name"), "her": (FEMALE, "object_or_possessive"),
+}
+
+
+def alias_key(text):
+    text = re.sub(r"[’']s$", "", text.strip())
+    return " ".join(text.replace(".", "").lower().split())
+
+
+def strip_possessive(text):
+    return re.sub(r"[’']s$", "", text.strip())
+
+
+def load_characters(path=KB_PATH):
+    """
+    (qids, names, genders, alias index) from the knowledge base. qids /
+    names / genders are indexed by character id; the alias index maps a
+    normalised alias ("mr darcy") to that id.
+    """
+    qids, names, genders, aliases = [], [], [], {}
+    with open(path, "r", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            cid = len(names)
+            qids.append(row[0].strip())
+            names.append(row[1].strip())
+            genders.append(GENDER_CODES.get(row[3].strip().upper(), UNKNOWN) if len(row) > 3 else UNKNOWN)
+            for alias in [row[1]] + (row[2].split(";") if len(row) > 2 else []):
+                if alias.strip():
+                    aliases.setdefault(alias_key(alias), cid)
+    return qids, names, np.array(genders, dtype=np.int8), aliases
+
+
+# ======================================================
+# 2. 显著性模型 (salience)
+# ======================================================
+class SalienceModel:
+    """
+    Fixed-size salience state: one slot per KB character plus a small ring
+    of slots for PERSON names the KB does not know. Every slot holds the
+    sentence of its last mention, a mention count, whether that mention was
+    a subject, and a gender. Mentions update one slot in O(1); choosing an
+    antecedent scores all slots at once with NumPy.
+
+    score = recency (halves every HALF_LIFE sentences) + FREQ_WEIGHT *
+    log(1 + mentions) + SUBJECT_BONUS, only for slots mentioned within the
+    last WINDOW sentences whose gender does not contradict the pronoun.
+    A pronoun is resolved only if the best score beats the runner-up by
+    MARGIN; otherwise it is left as it is rather than guessed.
+    """
+
+    WINDOW = 8
+    HALF_LIFE = 2.0
+    FREQ_WEIGHT = 0.15
+    SUBJECT_BONUS = 0.3
+    UNKNOWN_GENDER_PENALTY = 0.5
+    MARGIN = 0.2
+    OTHER_SLOTS = 8
+
+    def __init__(self, names, genders):
+        n = len(names) + self.OTHER_SLOTS
+        self.n_known = len(names)
+        self.names = list(names) + [None] * self.OTHER_SLOTS
+        self.gender = np.concatenate([genders, np.zeros(self.OTHER_SLOTS, dtype=np.int8)])
+        self.last_seen = np.full(n, -10 ** 9, dtype=np.int64)
+        self.mentions = np.zeros(n, dtype=np.float64)
+        self.subject = np.zeros(n, dtype=bool)
+        self._other = {}
+        self._next_other = 0
+
+    def slot_for_other(self, key, name, gender):
+        """Slot of an unknown PERSON name; the ring reuses the oldest slot."""
+        slot = self._other.get(key)
+        if slot is None:
+            slot = self.n_known + self._next_other
+            self._next_other = (self._next_other + 1) % self.OTHER_SLOTS
+            self._other = {k: s for k, s in self._other.items() if s != slot}
+            self._other[key] = slot
+            self.names[slot] = name
+            self.gender[slot] = gender
+            self.mentions[slot] = 0
+        return slot
+
+    def mention(self, slot, sentence, is_subject=False):
+        self.last_seen[slot] = sentence
+        self.mentions[slot] += 1
+        self.subject[slot] = is_subject
+
+    def resolve(self, gender, sentence):
+        """Slot of the antecedent for a pronoun of this gender, or None."""
+        age = sentence - self.last_seen
+        score = (0.5 ** (age / self.HALF_LIFE)
+                 + self.FREQ_WEIGHT * np.log1p(self.mentions)
+                 + self.SUBJECT_BONUS * self.subject)
+        score = np.where(self.gender == UNKNOWN, score - self.UNKNOWN_GENDER_PENALTY, score)
+        valid = (age <= self.WINDOW) & ((self.gender == gender) | (self.gender == UNKNOWN))
+        if not valid.any():
+            return None
+        score = np.where(valid, score, -math.inf)
+        best = int(np.argmax(score))
+        runner_up = np.partition(score, -2)[-2] if len(score) > 1 else -math.inf
+        if score[best] - runner_up < self.MARGIN:
+            return None
+        return best
+
+
+def _mention_slot(model, aliases, ent):
+    key = alias_key(ent.text)
+    cid = aliases.get(key)
+    if cid is not None:
+        return cid
+    first = ent[0].lower_.rstrip(".")
+    return model.slot_for_other(key, strip_possessive(ent.text),
+                                TITLE_GENDER.get(first, UNKNOWN))
+
+
+# ======================================================
+# 3. 强替换主逻辑 → 共指簇
+# ======================================================
+def strong_coref(docs, characters=None):
+    """
+    docs yields (doc, base) pairs in order, base being the character offset
+    of the doc in the text. Returns coreference clusters as dicts
+        {"qid": KB id or None, "name": str, "mentions": [[start, end, possessive], ...]}
+    holding the PERSON mentions and the pronouns resolved to them, in text
+    offsets. Nothing is re-parsed.
+    """
+    qids, names, genders, aliases = characters or load_characters()
+    model = SalienceModel(names, genders)
+    # unknown-name slots are reused, so their clusters are keyed by name
+    clusters = {}
+    sentence = 0
+
+    def add(slot, start, end, possessive=0):
+        key = slot if slot < model.n_known else model.names[slot]
+        cluster = clusters.get(key)
+        if cluster is None:
+            cluster = clusters[key] = {
+                "qid": qids[slot] if slot < model.n_known else None,
+                "name": model.names[slot],
+                "mentions": [],
+            }
+        cluster["mentions"].append([start, end, possessive])
+
+    for doc, base in docs:
+        doc = merge_titles(doc)   # ⭐ 关键：强制合并 Mr. Bennet
+        ents = {ent.start: ent for ent in doc.ents if ent.label_ == "PERSON"}
+
+        for sent in doc.sents:
+            i = sent.start
+            while i < sent.end:
+                ent = ents.get(i)
+                if ent is not None:
+                    slot = _mention_slot(model, aliases, ent)
+                    is_subject = any(t.dep_ in ("nsubj", "nsubjpass") for t in ent)
+                    model.mention(slot, sentence, is_subject)
+                    add(slot, base + ent.start_char, base + ent.end_char)
+                    i = ent.end
+                    continue
+
+                token = doc[i]
+                gender_role = PRONOUNS.get(token.lower_)
+                if gender_role is not None:
+                    slot = model.resolve(gender_role[0], sentence)
+                    if slot is not None:
+                        role = gender_role[1]
+                        possessive = role == "possessive" or (
+                            role == "object_or_possessive" and token.tag_ == "PRP$")
+                        start = base + token.idx
+                        add(slot, start, start + len(token.text), int(possessive))
+                        # the resolved pronoun keeps its antecedent salient
+                        model.mention(slot, sentence, token.dep_ in ("nsubj", "nsubjpass"))
+                i += 1
+            sentence += 1
+
+    return list(clusters.values())
+
+
+# ======================================================
+# 4. 输出
+# ======================================================
+def pronoun_replacements(text, clusters):
+    """(start, end, name or name’s) for every resolved pronoun mention."""
+    replacements = []
+    for cluster in clusters:
+        name = cluster["name"]
+        if not name:
+            continue
+        for start, end, possessive in cluster["mentions"]:
+            if text[start:end].lower() in PRONOUNS:
+                replacements.append((start, end, make_possessive(name) if possessive else name))
+    return replacements
+
+
+def apply_replacements(text, replacements):
+    """Splice (start, end, text) replacements into text in one pass."""
+    out, pos = [], 0
+    for start, end, new in sorted(replacements):
+        out.append(text[pos:start])
+        out.append(new)
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def paragraph_blocks(text):
+    """(start, block) for every blank-line separated block of the text."""
+    return [(m.start(), m.group()) for m in re.finditer(r"[^\n](?:[^\n]|\n(?!\n))*", text)]
@@ -0,0 +1,88 @@
+import numpy as np
+from spacy.util import filter_spans
+
+
+ANNOTATIONS_PATH = "coref_annotations.npz"
+
+
+def save_annotations(clusters, path=ANNOTATIONS_PATH):
+    """
+    Coreference clusters (coref.strong_coref format, offsets in
+    clean_book.txt) as a compact file: int32 mention offsets sorted by start,
+    the cluster of each mention, and one QID / name per cluster.
+    """
+    starts, ends, owner, possessive = [], [], [], []
+    qids, names = [], []
+    for cid, cluster in enumerate(clusters):
+        qids.append(cluster["qid"] or "")
+        names.append(cluster["name"] or "")
+        for start, end, poss in cluster["mentions"]:
+            starts.append(start)
+            ends.append(end)
+            owner.append(cid)
+            possessive.append(poss)
+    order = np.argsort(np.asarray(starts, dtype=np.int64), kind="stable")
+    np.savez_compressed(
+        path,
+        start=np.asarray(starts, dtype=np.int32)[order],
+        end=np.asarray(ends, dtype=np.int32)[order],
+        cluster=np.asarray(owner, dtype=np.int32)[order],
+        possessive=np.asarray(possessive, dtype=np.int8)[order],
+        qids=np.asarray(qids, dtype=str),
+        names=np.asarray(names, dtype=str),
+    )
+    print(f"✅ Saved {len(starts)} mentions in {len(clusters)} clusters → {path}")
+
+
+class CorefAnnotations:
+    """
+    Coreference layer over the original parse. apply() marks the annotated
+    mentions inside a Doc of clean_book.txt as PERSON entities whose kb_id_
+    is the cluster's QID, so extractors see "she" as Elizabeth without the
+    book being rewritten or parsed a second time.
+    """
+
+    def __init__(self, path=ANNOTATIONS_PATH):
+        with np.load(path) as data:
+            self.start = data["start"].astype(np.int64)
+            self.end = data["end"].astype(np.int64)
+            self.cluster = data["cluster"]
+            self.possessive = data["possessive"]
+            self.qids = data["qids"].tolist()
+            self.names = data["names"].tolist()
+        self._name_of_qid = {q: n for q, n in zip(self.qids, self.names) if q}
+
+    def __len__(self):
+        return len(self.start)
+
+    def mentions_between(self, start, end):
+        """Indices of the mentions that start in [start, end) of the book."""
+        lo, hi = np.searchsorted(self.start, [start, end], side="left")
+        return np.arange(lo, hi)
+
+    def apply(self, doc, base=0):
+        """
+        Add the mentions falling inside doc (which starts at book offset
+        base) to doc.ents. Existing entities win over overlapping mentions.
+        Returns the number of mentions added.
+        """
+        added = []
+        for m in self.mentions_between(base, base + len(doc.text)):
+            qid = self.qids[self.cluster[m]]
+            if not qid:
+                continue
+            span = doc.char_span(int(self.start[m] - base), int(self.end[m] - base),
+                                 label="PERSON", kb_id=qid, alignment_mode="expand")
+            if span is not None:
+                added.append(span)
+        if not added:
+            return 0
+        ents = list(doc.ents)
+        taken = {i for ent in ents for i in range(ent.start, ent.end)}
+        added = [s for s in filter_spans(added) if not taken.intersection(range(s.start, s.end))]
+        doc.ents = sorted(ents + added, key=lambda s: s.start)
+        return len(added)
+
+    def text_of(self, span):
+        """KB name for an annotated mention, the span text otherwise."""
+        return self._name_of_qid.get(getattr(span, "kb_id_", ""), span.text)
@@ -0,0 +1,296 @@
+import hashlib, json, os, re
+from collections import Counter
+
+import spacy
+
+from coref import (PRONOUNS, alias_key, load_characters, paragraph_blocks,
+                   strip_possessive, strong_coref)
+from local_llm import DEFAULT_URL, chat_json
+
+
+COREF_CACHE = "results/coref_cache"
+
+# words after "her" that mean it is an object pronoun, not a possessive
+HER_OBJECT_FOLLOWERS = {
+    "a", "an", "the", "to", "and", "or", "but", "that", "as", "than", "in", "on",
+    "at", "by", "for", "from", "with", "of", "into", "about", "up", "out", "off",
+    "so", "if", "when", "what", "how", "again", "too", "very", "herself", "all",
+}
+
+
+def guess_possessive(text, start, end):
+    """Possessive flag of a pronoun mention for backends that give no POS tags."""
+    word = text[start:end].lower()
+    if word == "his":
+        return 1
+    if word != "her":
+        return 0
+    follower = re.match(r"[ \t\n]*([A-Za-z]+)", text[end:end + 40])
+    return int(bool(follower) and follower.group(1).lower() not in HER_OBJECT_FOLLOWERS)
+
+
+# ======================================================
+# 1. Backends
+# ======================================================
+class CorefBackend:
+    """
+    A coreference model. resolve_batch takes window texts and returns, per
+    window, a list of clusters in the coref.strong_coref format with
+    window-local offsets (or None when the window failed and must not be
+    cached). version goes into the cache key, so bump it when the
+    backend's output changes; the key also carries a digest of the
+    characters (names, aliases, genders), so editing the KB invalidates it.
+    """
+
+    name = "base"
+    version = "1"
+
+    def __init__(self, characters=None):
+        self.characters = characters or load_characters()
+
+    def characters_digest(self):
+        qids, names, genders, aliases = self.characters
+        payload = json.dumps([qids, names, [int(g) for g in genders], sorted(aliases.items())])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def cache_tag(self):
+        return f"{self.name}-{self.version}-{self.characters_digest()}"
+
+    def resolve_batch(self, texts):
+        raise NotImplementedError
+
+    def clusters_from_spans(self, text, span_clusters):
+        """
+        Name and KB-link (start, end) span clusters from a neural model. The
+        QID is the majority KB alias among the cluster's mentions; clusters
+        with neither a KB alias nor a he/she pronoun (objects, places) are
+        dropped.
+        """
+        qids, names, _, aliases = self.characters
+        clusters = []
+        for spans in span_clusters:
+            words = [text[s:e] for s, e in spans]
+            pronouns = [w.lower() in PRONOUNS for w in words]
+            hits = Counter(aliases[k] for k in (alias_key(w) for w in words) if k in aliases)
+            if not hits and not any(pronouns):
+                continue
+            if hits:
+                cid = hits.most_common(1)[0][0]
+                qid, name = qids[cid], names[cid]
+            else:
+                proper = [strip_possessive(w) for w, p in zip(words, pronouns) if not p and w[:1].isupper()]
+                qid, name = None, (proper[0] if proper else None)
+            clusters.append({
+                "qid": qid, "name": name,
+                "mentions": [[s, e, guess_possessive(text, s, e)] for s, e in spans],
+            })
+        return clusters
+
+
+class HeuristicBackend(CorefBackend):
+    """The salience model of coref.strong_coref over one spaCy parse per window."""
+
+    name = "heuristic"
+
+    def __init__(self, nlp=None, model="en_core_web_lg", characters=None, n_process=1, batch_size=64):
+        super().__init__(characters)
+        self._nlp, self._model = nlp, model
+        self.n_process, self.batch_size = n_process, batch_size
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = spacy.load(self._model)
+        return self._nlp
+
+    def resolve_batch(self, texts):
+        docs = self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process)
+        return [strong_coref([(doc, 0)], self.characters) for doc in docs]
+
+
+class SpacyCorefBackend(CorefBackend):
+    """spacy-experimental's CPU coreference pipeline (en_coreference_web_trf)."""
+
+    name = "spacy"
+
+    def __init__(self, model="en_coreference_web_trf", characters=None, batch_size=8):
+        super().__init__(characters)
+        try:
+            import spacy_experimental  # noqa: F401  registers the coref factories
+        except ImportError as e:
+            raise ImportError("the spacy backend needs spacy-experimental: "
+                              "pip install spacy-experimental and the en_coreference_web_trf model") from e
+        self.nlp = spacy.load(model)
+        self.batch_size = batch_size
+
+    def resolve_batch(self, texts):
+        results = []
+        for doc in self.nlp.pipe(texts, batch_size=self.batch_size):
+            spans = [[(s.start_char, s.end_char) for s in group]
+                     for key, group in doc.spans.items() if key.startswith("coref_clusters")]
+            results.append(self.clusters_from_spans(doc.text, spans))
+        return results
+
+
+class FastCorefBackend(CorefBackend):
+    """fastcoref's distilled FCoref model on CPU."""
+
+    name = "fastcoref"
+
+    def __init__(self, characters=None, device="cpu"):
+        super().__init__(characters)
+        try:
+            from fastcoref import FCoref
+        except ImportError as e:
+            raise ImportError("the fastcoref backend needs fastcoref: pip install fastcoref") from e
+        self.model = FCoref(device=device)
+
+    def resolve_batch(self, texts):
+        preds = self.model.predict(texts=list(texts))
+        return [self.clusters_from_spans(text, pred.get_clusters(as_strings=False))
+                for text, pred in zip(texts, preds)]
+
+
+class LLMBackend(CorefBackend):
+    """
+    A local LLM behind an OpenAI-compatible chat endpoint (llama.cpp server,
+    vLLM, Ollama ...). Pronouns are numbered in the prompt and the model
+    only has to name the KB character each one refers to, so no character
+    offsets ever come from the model. Several windows share one request.
+    """
+
+    name = "llm"
+    PRONOUN_RE = re.compile(r"\b(?:he|him|his|she|her)\b", re.IGNORECASE)
+
+    def __init__(self, url=DEFAULT_URL, model="local",
+                 characters=None, timeout=120):
+        super().__init__(characters)
+        self.url, self.model, self.timeout = url, model, timeout
+
+    def cache_tag(self):
+        return f"{self.name}-{self.version}-{self.model}-{self.characters_digest()}"
+
+    def _prompt(self, texts):
+        names = ", ".join(self.characters[1])
+        parts = [
+            "For every numbered pronoun [k:pronoun] in the passages below, give the "
+            f"character it refers to, using one of these names: {names}. "
+            "Use null when it is none of them or unclear. Answer with JSON only, "
+            'shaped like {"1": {"3": "Elizabeth Bennet", "4": null}} '
+            "(passage number -> pronoun number -> name).",
+        ]
+        for p, text in enumerate(texts, 1):
+            counter = iter(range(1, 10 ** 6))
+            marked = self.PRONOUN_RE.sub(lambda m: f"[{next(counter)}:{m.group()}]", text)
+            parts.append(f"### Passage {p}\n{marked}")
+        return "\n\n".join(parts)
+
+    def resolve_batch(self, texts):
+        try:
+            answer = chat_json(self._prompt(texts), self.url, self.model, self.timeout)
+            if not isinstance(answer, dict):
+                raise ValueError("expected a JSON object")
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"⚠️ LLM coref request failed ({e}); {len(texts)} windows left unresolved")
+            return [None] * len(texts)
+
+        qids, names, _, aliases = self.characters
+        results = []
+        for p, text in enumerate(texts, 1):
+            picks = answer.get(str(p)) or {}
+            by_character = {}
+            for k, match in enumerate(self.PRONOUN_RE.finditer(text), 1):
+                cid = aliases.get(alias_key(str(picks.get(str(k)) or "")))
+                if cid is None:
+                    continue
+                cluster = by_character.setdefault(cid, {"qid": qids[cid], "name": names[cid], "mentions": []})
+                cluster["mentions"].append(
+                    [match.start(), match.end(), guess_possessive(text, match.start(), match.end())])
+            results.append(list(by_character.values()))
+        return results
+
+
+BACKENDS = {
+    "heuristic": HeuristicBackend,
+    "spacy": SpacyCorefBackend,
+    "fastcoref": FastCorefBackend,
+    "llm": LLMBackend,
+}
+
+
+# ======================================================
+# 2. Windows, cache, merge
+# ======================================================
+def paragraph_windows(text, window=4, overlap=1):
+    """
+    [(start, target_start, end)] character ranges: each window targets
+    `window` paragraph blocks and carries `overlap` preceding blocks as
+    context. Only mentions from target_start on are kept from a window.
+    """
+    blocks = paragraph_blocks(text)
+    windows = []
+    for first in range(0, len(blocks), window):
+        context = max(0, first - overlap)
+        last = min(len(blocks), first + window) - 1
+        windows.append((blocks[context][0], blocks[first][0], blocks[last][0] + len(blocks[last][1])))
+    return windows
+
+
+def _cache_path(cache_dir, tag, window_text):
+    digest = hashlib.sha1(window_text.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, tag, digest + ".json")
+
+
+def merge_clusters(windows, results):
+    """
+    Shift window clusters to book offsets, keep their target-region
+    mentions and merge clusters of the same KB character (or the same
+    unknown name) across windows.
+    """
+    merged = {}
+    for (start, target_start, _), clusters in zip(windows, results):
+        for cluster in clusters or []:
+            mentions = [[start + s, start + e, p] for s, e, p in cluster["mentions"]
+                        if start + s >= target_start]
+            if not mentions:
+                continue
+            key = cluster["qid"] or (cluster["name"] and "name:" + alias_key(cluster["name"]))
+            if not key:
+                continue
+            out = merged.setdefault(key, {"qid": cluster["qid"], "name": cluster["name"], "mentions": []})
+            out["mentions"].extend(mentions)
+    for cluster in merged.values():
+        cluster["mentions"].sort()
+    return list(merged.values())
+
+
+def resolve_book(text, backend, window=4, overlap=1, batch_size=16, cache_dir=COREF_CACHE):
+    """
+    Run a backend over paragraph windows of text in batches. Each window's
+    clusters are cached as <cache_dir>/<backend tag>/<sha1 of window text>.json,
+    so unchanged text is never resolved twice. Returns book-level clusters.
+    """
+    windows = paragraph_windows(text, window, overlap)
+    texts = [text[start:end] for start, _, end in windows]
+    paths = [_cache_path(cache_dir, backend.cache_tag(), t) for t in texts] if cache_dir else [None] * len(texts)
+
+    results = [None] * len(windows)
+    todo = []
+    for i, path in enumerate(paths):
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                results[i] = json.load(f)
+        else:
+            todo.append(i)
+    print(f"   {len(windows) - len(todo)} / {len(windows)} windows from cache")
+
+    for b in range(0, len(todo), batch_size):
+        batch = todo[b:b + batch_size]
+        for i, clusters in zip(batch, backend.resolve_batch([texts[i] for i in batch])):
+            results[i] = clusters
+            if clusters is not None and paths[i]:
+                os.makedirs(os.path.dirname(paths[i]), exist_ok=True)
+                with open(paths[i], "w", encoding="utf-8") as f:
+                    json.dump(clusters, f)
+
+    return merge_clusters(windows, results)
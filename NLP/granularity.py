@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from relation_aggregate import canonical_relation
+from relation_offsets import OFFSET_COLUMNS
+
+
+GRANULARITIES = ["sentence", "paragraph", "chapter", "100token"]
+
+# column layout of the checked-in results/*_by_* files; columns added by the
+# single-run tables (Mode/Source/Doc/Segment, sorted_pair) come after them
+CONSOLIDATED_COLUMNS = ["Relationship", "Entity1", "Entity2", "Entity1_ID", "Entity2_ID"]
+COUNTS_COLUMNS = ["Relationship", "Entity1", "Entity2", "Entity1_ID", "Entity2_ID",
+                  "relationship_type_count", "total_relationship_count", "unique_relationship_types"]
+
+
+def legacy_order(df, columns):
+    """df with `columns` first, in that order, and any other columns after them."""
+    return df[[c for c in columns if c in df.columns] + [c for c in df.columns if c not in columns]]
+
+
+def assign_segments(offsets, stores, nlp=None):
+    """
+    Segment index of every relation at every granularity, from the offsets
+    rows alone: the relation word's start offset is looked up in the book
+    store of its doc_id. Returns {granularity: int array} (-1 = outside).
+    """
+    offsets = np.asarray(offsets).reshape(-1, len(OFFSET_COLUMNS))
+    doc_ids = offsets[:, OFFSET_COLUMNS.index("doc_id")]
+    positions = offsets[:, OFFSET_COLUMNS.index("rel_start")]
+
+    segments = {}
+    for by in GRANULARITIES:
+        seg = np.full(len(offsets), -1, dtype=np.int64)
+        for doc_id, store in stores.items():
+            mask = doc_ids == doc_id
+            if mask.any():
+                seg[mask] = store.locate(by, positions[mask], nlp)
+        segments[by] = seg
+    return segments
+
+
+def write_granularity_tables(rows, offsets, stores, nlp=None):
+    """
+    Write the by_sentence / by_paragraph / by_chapter / by_100token versions
+    of conslidated_relationships, relationships_with_counts and
+    relationship_pivot_summary from one extraction run.
+
+    At each granularity a relation is counted once per segment that attests
+    it, so the counts read "number of sentences / paragraphs / chapters /
+    100-token windows mentioning this relation".
+    """
+    df = pd.DataFrame(rows).reset_index(drop=True)
+    if df.empty:
+        print("No relations to split by granularity.")
+        return
+    # imported here so extraction-only runs of main3 don't load igraph / matplotlib
+    from post_process_updated import load_names, summarize_relationships, save_summary
+    from relation_timeline import RelationTimeline
+
+    df["Relationship"] = df["Relationship"].astype(str).map(canonical_relation)
+    df["Doc"] = np.asarray(offsets).reshape(-1, len(OFFSET_COLUMNS))[:, 0]
+    segments = assign_segments(offsets, stores, nlp)
+    name_dict = load_names()
+    os.makedirs("results", exist_ok=True)
+
+    for by in GRANULARITIES:
+        table = df.assign(Segment=segments[by])
+        table = table[table["Segment"] >= 0]
+        legacy_order(table, CONSOLIDATED_COLUMNS).to_csv(
+            f"results/conslidated_relationships_by_{by}.csv",
+            index=False, encoding="utf-8")
+
+        per_segment = (
+            table.drop_duplicates(["Doc", "Segment", "Relationship", "Entity1_ID", "Entity2_ID"])
+            .assign(Count=1)
+        )
+        tensor, out, pivot = summarize_relationships(per_segment, name_dict)
+        save_summary(tensor, legacy_order(out, COUNTS_COLUMNS), pivot, suffix=f"_by_{by}")
+
+        if by == "chapter":
+            # every mention counts here: the timeline tracks weight, not presence;
+            # segment 0 is the front matter before CHAPTER I
+            n_chapters = max(len(store.bounds("chapter")[0]) for store in stores.values()) - 1
+            timeline = RelationTimeline.from_frame(table, name_dict, n_chapters=n_chapters)
+            timeline.save("results/relationship_timeline.npz")
+            timeline.plot_evolution(name_dict=name_dict)
@@ -0,0 +1,137 @@
+import argparse, os
+
+import numpy as np
+import pandas as pd
+
+from render import graph_hash
+
+
+ANALYTICS_CACHE = "results/analytics_cache"
+# part of the cache key; bump when the cached table layout changes
+CACHE_VERSION = 2
+METRIC_COLUMNS = [
+    "QID", "Name", "Degree", "WeightedDegree", "Betweenness", "PageRank",
+    "Community", "EgoSize", "EgoEdges", "EgoWeight",
+]
+
+
+def _collapse(g, weight="weight"):
+    """
+    Merged corpus graphs carry one edge per (pair, relation, book); metrics
+    are taken on the simple graph with the weights of parallel edges summed.
+    """
+    if g.is_simple():
+        return g
+    g = g.copy()
+    g.simplify(multiple=True, loops=True, combine_edges={weight: "sum"})
+    return g
+
+
+def _labels(g):
+    """Display names in vertex order: the label attribute, else the QID."""
+    if "label" in g.vs.attributes():
+        return g.vs["label"]
+    return g.vs["name"] if "name" in g.vs.attributes() else [str(i) for i in range(g.vcount())]
+
+
+# ========== 1. Metrics ==========
+def compute_metrics(g, weight="weight"):
+    """
+    One row per character. Everything runs in igraph's C routines; the
+    ego-network sizes come from degrees and the triangle list rather than
+    from extracting each ego subgraph.
+      WeightedDegree  sum of edge weights (strength)
+      Betweenness     shortest paths with distance 1 / weight, so frequent
+                      relations count as close
+      PageRank        weighted PageRank
+      Community       multilevel (Louvain) community id
+      EgoSize         the character plus its neighbours
+      EgoEdges        edges inside the ego network (degree + triangles)
+      EgoWeight       total weight of the character's incident edges plus
+                      the edges between its neighbours
+    """
+    g = _collapse(g, weight)
+    n = g.vcount()
+    w = np.asarray(g.es[weight], dtype=np.float64) if weight in g.es.attributes() else np.ones(g.ecount())
+
+    degree = np.asarray(g.degree(), dtype=np.int64)
+    strength = np.asarray(g.strength(weights=w.tolist()), dtype=np.float64)
+    distance = (1.0 / np.where(w > 0, w, np.nan))
+    distance = np.nan_to_num(distance, nan=np.inf).tolist()
+    betweenness = np.asarray(g.betweenness(weights=distance, directed=False), dtype=np.float64)
+    pagerank = np.asarray(g.pagerank(weights=w.tolist(), directed=False), dtype=np.float64)
+    communities = g.community_multilevel(weights=w.tolist()).membership if g.ecount() else list(range(n))
+
+    # every triangle (a, b, c) puts edge (b, c) inside the ego network of a,
+    # and likewise for b and c
+    triangles = np.zeros(n, dtype=np.int64)
+    ego_weight = strength.copy()
+    tri = np.asarray(g.list_triangles(), dtype=np.int64).reshape(-1, 3)
+    if len(tri):
+        triangles = np.bincount(tri.ravel(), minlength=n)
+        for ego, (b, c) in ((0, (1, 2)), (1, (0, 2)), (2, (0, 1))):
+            eids = g.get_eids(np.column_stack([tri[:, b], tri[:, c]]).tolist(), directed=False)
+            ego_weight += np.bincount(tri[:, ego], weights=w[eids], minlength=n)
+
+    names = g.vs["name"] if "name" in g.vs.attributes() else [str(i) for i in range(n)]
+    return pd.DataFrame({
+        "QID": names,
+        "Name": _labels(g),
+        "Degree": degree,
+        "WeightedDegree": strength,
+        "Betweenness": betweenness,
+        "PageRank": pagerank,
+        "Community": np.asarray(communities, dtype=np.int64),
+        "EgoSize": degree + 1,
+        "EgoEdges": degree + triangles,
+        "EgoWeight": ego_weight,
+    }, columns=METRIC_COLUMNS)
+
+
+def ego_network(g, character, order=1):
+    """Induced subgraph of a character (QID or vertex index) and its neighbours."""
+    return g.induced_subgraph(g.neighborhood(character, order=order))
+
+
+# ========== 2. Cached table ==========
+def character_metrics(g, weight="weight", cache_dir=ANALYTICS_CACHE):
+    """
+    compute_metrics, cached as <cache_dir>/<graph hash>-v<CACHE_VERSION>.csv
+    so an unchanged graph is never analysed twice. The hash covers QIDs,
+    edges and weights but not the vertex labels, so the cache holds
+    everything except Name, which is always taken from the graph at hand.
+    """
+    path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{graph_hash(g, weight)}-v{CACHE_VERSION}.csv")
+        if os.path.exists(path):
+            metrics = pd.read_csv(path, dtype={"QID": str})
+            metrics.insert(METRIC_COLUMNS.index("Name"), "Name", _labels(g))
+            return metrics[METRIC_COLUMNS]
+    metrics = compute_metrics(g, weight)
+    if path:
+        metrics.drop(columns="Name").to_csv(path, index=False, encoding="utf-8")
+    return metrics
+
+
+def write_character_metrics(g, out_path="results/character_metrics.csv", weight="weight"):
+    metrics = character_metrics(g, weight).sort_values("PageRank", ascending=False)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    metrics.to_csv(out_path, index=False, encoding="utf-8")
+    print(f"✅ Character metrics saved as {out_path}")
+    return metrics
+
+
+if __name__ == "__main__":
+    import igraph as ig
+    from graph_store import load_edge_list
+
+    parser = argparse.ArgumentParser(description="Per-character network metrics for a relationship graph.")
+    parser.add_argument("graph", nargs="?", default="results/character_relationships_weighted.npz",
+                        help="edge-list .npz (graph_store) or any file igraph can read")
+    parser.add_argument("--out", default="results/character_metrics.csv")
+    args = parser.parse_args()
+
+    graph = load_edge_list(args.graph) if args.graph.endswith(".npz") else ig.Graph.Read(args.graph)
+    write_character_metrics(graph, args.out)
@@ -0,0 +1,310 @@
+import argparse, os
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from vocabulary import StringTable
+
+
+# One fixed-size record per edge in the binary corpus graph.
+EDGE_DTYPE = np.dtype([
+    ("src", "<i4"), ("dst", "<i4"),
+    ("rel", "<i4"), ("weight", "<f4"),
+    ("book", "<i4"),
+])
+CORPUS_DIR = "results/corpus_graph"
+
+
+# ========== 1. Streaming text writers ==========
+def _columns(attrs, n):
+    """attrs: {name: sequence of length n}; yields per-row {name: value}."""
+    names = list(attrs)
+    values = [list(attrs[k]) for k in names]
+    for i in range(n):
+        yield {k: v[i] for k, v in zip(names, values)}
+
+
+class _StreamWriter:
+    """
+    Writes nodes and edges as they arrive instead of serialising a finished
+    in-memory graph. With append=True an existing file is reopened, its
+    closing footer is cut off and writing continues after the last element,
+    so new books are added without rewriting what is already there.
+    """
+
+    HEADER = ""
+    FOOTER = ""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if append and os.path.exists(path):
+            footer = self.FOOTER.encode("utf-8")
+            with open(path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                end = f.tell() - len(footer)
+                f.seek(max(end, 0))
+                if f.read() != footer:
+                    raise ValueError(f"{path} does not end with the expected footer; cannot append")
+                f.truncate(end)
+            self._file = open(path, "a", encoding="utf-8", newline="\n")
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="\n")
+            self._file.write(self.HEADER)
+
+    def write_nodes(self, ids, **attrs):
+        ids = np.asarray(ids).tolist()
+        for node_id, row in zip(ids, _columns(attrs, len(ids))):
+            self._file.write(self._node(node_id, row))
+
+    def write_edges(self, src, dst, **attrs):
+        src, dst = np.asarray(src).tolist(), np.asarray(dst).tolist()
+        for s, t, row in zip(src, dst, _columns(attrs, len(src))):
+            self._file.write(self._edge(s, t, row))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(self.FOOTER)
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GMLWriter(_StreamWriter):
+    """GML in the layout igraph's write_gml produces (and Graph.Read_GML reads)."""
+
+    HEADER = "Version 1\ngraph\n[\n  directed 0\n"
+    FOOTER = "]\n"
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+            return repr(value.item() if hasattr(value, "item") else value)
+        return '"' + str(value).replace("&", "&amp;").replace('"', "&quot;") + '"'
+
+    def _attrs(self, row):
+        return "".join(f"    {k} {self._value(v)}\n" for k, v in row.items())
+
+    def _node(self, node_id, row):
+        return f"  node\n  [\n    id {node_id}\n{self._attrs(row)}  ]\n"
+
+    def _edge(self, src, dst, row):
+        return f"  edge\n  [\n    source {src}\n    target {dst}\n{self._attrs(row)}  ]\n"
+
+
+class GraphMLWriter(_StreamWriter):
+    """
+    GraphML with a fixed attribute schema (keys must be declared before the
+    graph element, so they cannot depend on what is streamed later).
+    """
+
+    NODE_KEYS = {"name": "string", "label": "string", "size": "double"}
+    EDGE_KEYS = {"relationship": "string", "weight": "double", "book": "string"}
+    HEADER = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        + "".join(f'  <key id="v_{k}" for="node" attr.name="{k}" attr.type="{t}"/>\n'
+                  for k, t in NODE_KEYS.items())
+        + "".join(f'  <key id="e_{k}" for="edge" attr.name="{k}" attr.type="{t}"/>\n'
+                  for k, t in EDGE_KEYS.items())
+        + '  <graph id="G" edgedefault="undirected">\n'
+    )
+    FOOTER = "  </graph>\n</graphml>\n"
+
+    @staticmethod
+    def _data(prefix, row):
+        return "".join(f'      <data key="{prefix}_{k}">{escape(str(v))}</data>\n'
+                       for k, v in row.items())
+
+    def _node(self, node_id, row):
+        return f"    <node id=\"n{node_id}\">\n{self._data('v', row)}    </node>\n"
+
+    def _edge(self, src, dst, row):
+        return (f"    <edge source={quoteattr(f'n{src}')} target={quoteattr(f'n{dst}')}>\n"
+                f"{self._data('e', row)}    </edge>\n")
+
+
+WRITERS = {".gml": GMLWriter, ".graphml": GraphMLWriter}
+
+
+# ========== 2. Binary edge list ==========
+def save_edge_list(path, names, src, dst, node_attrs=None, edge_attrs=None):
+    """
+    Compact binary graph: node names, int32 endpoints and one array per
+    attribute in a single .npz. Loads without any text parsing.
+    """
+    arrays = {"names": np.asarray(names, dtype=str),
+              "src": np.asarray(src, dtype=np.int32),
+              "dst": np.asarray(dst, dtype=np.int32)}
+    for prefix, attrs in (("v_", node_attrs or {}), ("e_", edge_attrs or {})):
+        for k, v in attrs.items():
+            v = np.asarray(v)
+            arrays[prefix + k] = v.astype(str) if v.dtype == object else v
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, **arrays)
+
+
+def load_edge_list(path):
+    """igraph.Graph from a save_edge_list file."""
+    import igraph as ig
+
+    with np.load(path) as data:
+        g = ig.Graph(n=len(data["names"]),
+                     edges=np.column_stack([data["src"], data["dst"]]).tolist(),
+                     directed=False)
+        g.vs["name"] = data["names"].tolist()
+        for key in data.files:
+            if key.startswith("v_"):
+                g.vs[key[2:]] = data[key].tolist()
+            elif key.startswith("e_"):
+                g.es[key[2:]] = data[key].tolist()
+    return g
+
+
+def export_graph(base_path, names, src, dst, node_attrs=None, edge_attrs=None,
+                 formats=(".gml", ".npz")):
+    """
+    Write one graph to <base_path><ext> for every requested format, streaming
+    the text formats straight from the node / edge arrays.
+    """
+    node_attrs, edge_attrs = node_attrs or {}, edge_attrs or {}
+    paths = []
+    for ext in formats:
+        path = base_path + ext
+        if ext == ".npz":
+            save_edge_list(path, names, src, dst, node_attrs, edge_attrs)
+        else:
+            with WRITERS[ext](path) as writer:
+                writer.write_nodes(np.arange(len(names)), name=names, **node_attrs)
+                writer.write_edges(src, dst, **edge_attrs)
+        paths.append(path)
+    return paths
+
+
+# ========== 3. Append-only corpus graph ==========
+class CorpusGraph:
+    """
+    Graph over many books kept in a directory of append-only files:
+        nodes.tsv       name <TAB> label, node id = line number
+        relations.txt   relation type per line, id = line number
+        books.txt       book name per line, id = line number
+        edges.bin       EDGE_DTYPE records
+    Adding a book appends new lines / records and never rewrites earlier
+    ones; edges.bin is read back as a memory map.
+    """
+
+    def __init__(self, path=CORPUS_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.nodes = StringTable()
+        self.labels = []
+        for line in self._lines("nodes.tsv"):
+            name, _, label = line.partition("\t")
+            self.nodes.add(name)
+            self.labels.append(label)
+        self.relations = StringTable(self._lines("relations.txt"))
+        self.books = StringTable(self._lines("books.txt"))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _lines(self, name):
+        if not os.path.exists(self._file(name)):
+            return []
+        with open(self._file(name), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    @staticmethod
+    def _grow(table, values):
+        """Encode values into table; returns (ids, index of the first new entry)."""
+        first_new = len(table)
+        return np.array([table.add(v) for v in values], dtype=np.int32), first_new
+
+    def append_book(self, book, src, dst, relations, weights, labels=None, export=(".gml",)):
+        """
+        Add one book's edges (src / dst are node names, e.g. QIDs). New nodes,
+        relation types and the book name are appended to the tables; the
+        corpus GML / GraphML files listed in export are extended in place.
+        """
+        if book in self.books.index:
+            raise ValueError(f"book {book!r} is already in the corpus graph")
+        labels = labels or {}
+        book_id, _ = self._grow(self.books, [book])
+        src_ids, first_node = self._grow(self.nodes, list(src))
+        dst_ids, _ = self._grow(self.nodes, list(dst))
+        rel_ids, first_rel = self._grow(self.relations, list(relations))
+
+        new_nodes = self.nodes.values[first_node:]
+        new_labels = [labels.get(n, n) for n in new_nodes]
+        self.labels.extend(new_labels)
+        with open(self._file("nodes.tsv"), "a", encoding="utf-8") as f:
+            f.writelines(f"{n}\t{lab}\n" for n, lab in zip(new_nodes, new_labels))
+        with open(self._file("relations.txt"), "a", encoding="utf-8") as f:
+            f.writelines(f"{r}\n" for r in self.relations.values[first_rel:])
+        with open(self._file("books.txt"), "a", encoding="utf-8") as f:
+            f.write(f"{book}\n")
+
+        records = np.empty(len(src_ids), dtype=EDGE_DTYPE)
+        records["src"], records["dst"], records["rel"] = src_ids, dst_ids, rel_ids
+        records["weight"] = np.asarray(weights, dtype=np.float32)
+        records["book"] = book_id[0]
+        with open(self._file("edges.bin"), "ab") as f:
+            records.tofile(f)
+
+        for ext in export:
+            path = self._file("corpus" + ext)
+            with WRITERS[ext](path, append=os.path.exists(path)) as writer:
+                writer.write_nodes(np.arange(first_node, len(self.nodes)),
+                                   name=new_nodes, label=new_labels)
+                writer.write_edges(src_ids, dst_ids,
+                                   relationship=[self.relations.values[r] for r in rel_ids],
+                                   weight=records["weight"], book=[book] * len(records))
+        return len(records)
+
+    def edges(self):
+        path = self._file("edges.bin")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=EDGE_DTYPE)
+        return np.memmap(path, dtype=EDGE_DTYPE, mode="r")
+
+    def to_igraph(self, books=None):
+        """igraph.Graph of the corpus, optionally restricted to some book names."""
+        import igraph as ig
+
+        edges = self.edges()
+        if books is not None:
+            ids = [self.books.encode(b) for b in books]
+            edges = edges[np.isin(edges["book"], ids)]
+        g = ig.Graph(n=len(self.nodes),
+                     edges=np.column_stack([edges["src"], edges["dst"]]).tolist(),
+                     directed=False)
+        g.vs["name"] = list(self.nodes.values)
+        g.vs["label"] = list(self.labels)
+        g.es["relationship"] = self.relations.decode(edges["rel"]).tolist()
+        g.es["weight"] = edges["weight"].tolist()
+        g.es["book"] = self.books.decode(edges["book"]).tolist()
+        return g
+
+
+# ========== 4. CLI ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append a book's relationship graph to the corpus graph.")
+    parser.add_argument("book", help="name recorded for the book")
+    parser.add_argument("graph", help="edge-list .npz written by export_graph / draw_graph")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--export", nargs="*", default=[".gml"], choices=list(WRITERS))
+    args = parser.parse_args()
+
+    with np.load(args.graph) as data:
+        names = data["names"]
+        src, dst = names[data["src"]], names[data["dst"]]
+        rel = data["e_relationship"] if "e_relationship" in data.files else np.full(len(src), "related")
+        weight = data["e_weight"] if "e_weight" in data.files else np.ones(len(src))
+        labels = dict(zip(names.tolist(), data["v_label"].tolist())) if "v_label" in data.files else {}
+    added = CorpusGraph(args.corpus).append_book(args.book, src.tolist(), dst.tolist(),
+                                                 rel.tolist(), weight, labels, export=args.export)
+    print(f"✅ Appended {added} edges from {args.book} to {args.corpus}")
@@ -0,0 +1,122 @@
+from relation_store import RelationRecord
+from local_llm import DEFAULT_URL, PromptCache, chat_json
+
+
+LLM_CACHE = "results/llm_cache"
+
+
+class RelationCandidate:
+    """A sentence with at least two PERSON mentions where no rule fired."""
+
+    __slots__ = ("doc_id", "sent_idx", "start", "text", "persons")
+
+    def __init__(self, doc_id, sent_idx, start, text, persons):
+        self.doc_id = doc_id
+        self.sent_idx = sent_idx
+        self.start = start          # book offset of the sentence
+        self.text = text
+        self.persons = persons      # [(name, start, end)] in book offsets
+
+
+def relation_candidate(doc, base, sent_idx, doc_id=0, text_of=None):
+    """
+    RelationCandidate for a parsed sentence with two or more distinct PERSON
+    names, or None. text_of maps an entity Span to the name to use (the KB
+    name for coreference-annotated mentions).
+    """
+    text_of = text_of or (lambda span: span.text)
+    persons, seen = [], set()
+    for ent in doc.ents:
+        if ent.label_ != "PERSON":
+            continue
+        name = text_of(ent)
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            persons.append((name, base + ent.start_char, base + ent.end_char))
+    if len(persons) < 2:
+        return None
+    return RelationCandidate(doc_id, sent_idx, base, doc.text, persons)
+
+
+class LLMRelationExtractor:
+    """
+    Relation extraction by a local LLM, for the sentences the rules missed.
+    Candidates are sent batch_size at a time in one numbered prompt; the
+    model may only answer with relation words from rel_words and people
+    listed for that sentence, and anything else is dropped. Parsed replies
+    are cached by prompt hash, so re-runs over unchanged sentences make no
+    requests.
+    """
+
+    def __init__(self, rel_words, url=DEFAULT_URL, model="local", batch_size=20,
+                 cache_dir=LLM_CACHE, timeout=120):
+        self.rel_words = sorted(rel_words)
+        self.url, self.model, self.timeout = url, model, timeout
+        self.batch_size = batch_size
+        self.cache = PromptCache(cache_dir, model) if cache_dir else None
+        self.requests = self.failures = 0
+
+    def _prompt(self, batch):
+        parts = [
+            "For each numbered sentence, list the family or social relationships it "
+            "states between the people named after it. Use only these relation words: "
+            f"{', '.join(self.rel_words)}. \"A is B's sister\" is "
+            '{"sentence": k, "entity1": "A", "relation": "sister", "entity2": "B"}. '
+            "Answer with a JSON list of such objects only; use [] when no relation is stated.",
+        ]
+        for k, cand in enumerate(batch, 1):
+            names = "; ".join(name for name, _, _ in cand.persons)
+            text = " ".join(cand.text.split())
+            parts.append(f"{k}. {text}\n   People: {names}")
+        return "\n\n".join(parts)
+
+    def _ask(self, prompt):
+        if self.cache is not None:
+            answer = self.cache.get(prompt)
+            if answer is not None:
+                return answer
+        self.requests += 1
+        try:
+            answer = chat_json(prompt, self.url, self.model, self.timeout)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            self.failures += 1
+            print(f"⚠️ LLM relation request failed ({e})")
+            return []
+        if not isinstance(answer, list):
+            answer = []
+        if self.cache is not None:
+            self.cache.put(prompt, answer)
+        return answer
+
+    def _records(self, batch, answer):
+        allowed = set(self.rel_words)
+        for item in answer:
+            if not isinstance(item, dict):
+                continue
+            try:
+                cand = batch[int(item.get("sentence")) - 1]
+            except (TypeError, ValueError, IndexError):
+                continue
+            rel = str(item.get("relation", "")).strip().lower()
+            if rel not in allowed:
+                continue
+            people = {name.lower(): (name, s, e) for name, s, e in cand.persons}
+            e1 = people.get(str(item.get("entity1", "")).strip().lower())
+            e2 = people.get(str(item.get("entity2", "")).strip().lower())
+            if e1 is None or e2 is None or e1 is e2:
+                continue
+            # the relation is evidenced by the whole sentence, not one word
+            sent_end = cand.start + len(cand.text)
+            offsets = (cand.doc_id, cand.sent_idx, cand.start, sent_end, e1[1], e1[2], e2[1], e2[2])
+            yield RelationRecord(rel, e1[0], e2[0], "sentence", "llm", offsets)
+
+    def extract(self, candidates):
+        """RelationRecords for a list of RelationCandidates."""
+        records = []
+        for b in range(0, len(candidates), self.batch_size):
+            batch = candidates[b:b + self.batch_size]
+            records.extend(self._records(batch, self._ask(self._prompt(batch))))
+        hits = self.cache.hits if self.cache is not None else 0
+        print(f" LLM relations: {len(candidates)} candidate sentences, {self.requests} requests "
+              f"({hits} cached, {self.failures} failed), {len(records)} relations")
+        return records
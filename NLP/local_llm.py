@@ -0,0 +1,53 @@
+import hashlib, json, os
+import urllib.request
+
+
+DEFAULT_URL = "http://localhost:8080/v1/chat/completions"
+
+
+def chat_json(prompt, url=DEFAULT_URL, model="local", timeout=120):
+    """
+    Send one user prompt to an OpenAI-compatible chat endpoint (llama.cpp
+    server, vLLM, Ollama ...) at temperature 0 and parse the JSON object or
+    list in the reply. Raises OSError / ValueError / KeyError on failure.
+    """
+    body = json.dumps({
+        "model": model, "temperature": 0,
+        "messages": [{"role": "user", "content": prompt}],
+    }).encode("utf-8")
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        reply = json.load(response)
+    content = reply["choices"][0]["message"]["content"]
+    first = min((i for i in (content.find("{"), content.find("[")) if i >= 0), default=-1)
+    last = max(content.rfind("}"), content.rfind("]"))
+    if first < 0 or last < first:
+        raise ValueError("no JSON in the model reply")
+    return json.loads(content[first:last + 1])
+
+
+class PromptCache:
+    """Parsed replies on disk, one JSON file per sha1 of (model, prompt)."""
+
+    def __init__(self, cache_dir, model="local"):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.hits = self.misses = 0
+
+    def _path(self, prompt):
+        digest = hashlib.sha1(f"{self.model}\0{prompt}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".json")
+
+    def get(self, prompt):
+        path = self._path(prompt)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, prompt, answer):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._path(prompt), "w", encoding="utf-8") as f:
+            json.dump(answer, f)
@@ -3,9 +3,12 @@ import pandas as pd
 import networkx as nx
 
 import re, itertools
-import matplotlib.pyplot as plt
 import igraph as ig
 
+from book_store import BookStore
+from render import render_graph
+from graph_store import export_graph
+
 
 def remove_headers_footers(text):
     lines = text.split("\n")
@@ -15,7 +18,9 @@ def remove_headers_footers(text):
     return text
 
 
-def show_result(character_relations_dictionary, characters):
+def show_result(character_relations_dictionary, characters,
+                image_path="relationship_by_chapter.png",
+                graph_path="results/relationship_by_chapter"):
     character_names = [char[0] for char in characters]
     name_to_index = {name: i for i, name in enumerate(character_names)}
     n_vertices = len(characters)
@@ -35,10 +40,14 @@ def show_result(character_relations_dictionary, characters):
     print(f"Edges (as indices): {edges}")
     print(f"Weights: {weights}")
     print(f"Character names: {character_names}")
-    fig, ax = plt.subplots(figsize=(8, 8))
-    ig.plot(
+    # persist the co-occurrence graph (GML + binary edge list) next to the image
+    export_graph(graph_path, character_names,
+                 [s for s, _ in edges], [t for _, t in edges],
+                 edge_attrs={"weight": weights})
+    render_graph(
         g,
-        target=ax,
+        image_path,
+        figsize=(8, 8),
         vertex_size=40,
         vertex_color=["steelblue"],
         vertex_frame_width=4.0,
@@ -52,27 +61,18 @@ def show_result(character_relations_dictionary, characters):
         ],  # Use weights for edge color
     )
 
-    plt.show()
-
 
 def main():
     # load text from file
     # r=read
-    with open("42671.txt", "r", encoding="utf-8") as file:
-        text = file.read()
-
-    text = remove_headers_footers(text)
-    text = text.replace(".", "")
-    # Split chapters using regex that starts with CHAPTER
-    # ^ means start of line, \s+ means one or more whitespace characters
-    # This regex captures chapter headings like "CHAPTER I.", "CHAPTER II.", etc
-    chapters = re.split(
-        r"^CHAPTER\s+[IVXLC\d]+", text, flags=re.IGNORECASE | re.MULTILINE
-    )
-
+    # clean_book.txt is 42671.txt with headers/footers removed (pre_process.py).
+    # Chapter boundaries come from the book store's persisted offset index,
+    # so only the chapter slices are read, not a re-split of the whole book.
+    book = BookStore("clean_book.txt")
     # remove . for Mr./Mrs. etc to match the word in character file.
-    # remove the first item which is empty
-    chapters.pop(0)
+    # remove the first item which is the text before CHAPTER I
+    chapters = [chunk.replace(".", "") for _, chunk in book.chunks("chapter")][1:]
+    text = book.book.read().replace(".", "")
 
     print(f"Number of chapters found: {len(chapters)}")
     # if len(chapters) > 1:
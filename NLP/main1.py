@@ -1,9 +1,10 @@
 import spacy, re, csv, os
 from spacy.tokens import Span
 from spacy.kb import KnowledgeBase, InMemoryLookupKB
-from spacy.matcher import Matcher
 import pandas as pd
 
+from relation_lexicon import relation_matcher, is_compound_tail
+
 
 def load_entities():
     entities_path = "characters.csv"
@@ -95,27 +96,11 @@ def build_knowledge_base(nlp):
 
 
 def build_reliationships(doc, nlp):
-    relationship_patterns = [
-        [{"LOWER": {"IN": ["friend", "friends"]}}],  # Matches both singular and plural
-        [{"LOWER": "couple"}],
-        [{"LOWER": "brother"}],
-        [{"LOWER": "sister"}],
-        [
-            {"LOWER": {"IN": ["daughter", "daughters"]}}
-        ],  # Matches both singular and plural
-        [{"LOWER": {"IN": ["son", "sons"]}}],
-        [{"LOWER": "parent"}],
-        [{"LOWER": "father"}],
-        [{"LOWER": "mother"}],
-        [{"LOWER": "wife"}],
-        [{"LOWER": "husband"}],
-    ]
-
-    # Create matcher
-    matcher = Matcher(nlp.vocab)
-    # Add patterns
-    matcher.add("RELATIONSHIPS", relationship_patterns, on_match=add_relationship)
-    matches = matcher(doc)
+    # relation words and their plurals come from relation_lexicon.json
+    matcher = relation_matcher(nlp, "main1_script")
+    matches = [m for m in matcher(doc) if not is_compound_tail(doc, m[1])]
+    for i in range(len(matches)):
+        add_relationship(matcher, doc, i, matches)
 
 
 def cluster_name_entities(doc, kb):
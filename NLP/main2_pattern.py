@@ -2,8 +2,12 @@ import spacy, re, csv, os
 from spacy.tokens import Span
 from spacy.kb import KnowledgeBase, InMemoryLookupKB, get_candidates
 from spacy.matcher import Matcher
+from spacy.attrs import DEP
+import numpy as np
 import pandas as pd
 
+from relation_lexicon import relation_lexicon
+
 
 def load_entities():
     entities_path = "characters.csv"
@@ -126,53 +130,64 @@ def divide_text_by(nlp, text, by=None):
         return chunks
 
 
+def _dep_flags(dep):
+    # (punct, compound, modifier, subject, object) for one dependency label;
+    # subject / object keep the old `dep.find(...) == True` test, i.e. the
+    # word starts at index 1 ("nsubj", "dobj", "pobj")
+    return (dep == "punct", dep == "compound", dep.endswith("mod"),
+            dep.find("subj") == 1, dep.find("obj") == 1)
+
+
 def get_entities(nlp, sent):
+    doc = nlp(sent)
+
     ## chunk 1
+    # DEP column in one Doc.to_array call; the label tests run once per
+    # distinct label and are broadcast to the tokens
+    deps = doc.to_array(DEP)
+    labels, codes = np.unique(deps, return_inverse=True)
+    flags = np.array([_dep_flags(doc.vocab.strings[int(h)]) for h in labels],
+                     dtype=bool).reshape(-1, 5)[codes]
+
+    # punctuation is skipped, so "previous token" means previous non-punct token
+    kept = np.flatnonzero(~flags[:, 0])
+    flags = flags[kept]
+    prv_compound = np.zeros(len(kept), dtype=bool)
+    prv_compound[1:] = flags[:-1, 1]
+
     ent1 = ""
     ent2 = ""
-
-    prv_tok_dep = ""  # dependency tag of previous token in the sentence
-    prv_tok_text = ""  # previous token in the sentence
-
     prefix = ""
     modifier = ""
 
     #############################################################
 
-    for tok in nlp(sent):
+    # only tokens that are a compound, modifier, subject or object change the state
+    for k in np.flatnonzero(flags[:, 1:].any(axis=1)):
+        text = doc[int(kept[k])].text
+        prv_tok_text = doc[int(kept[k - 1])].text if prv_compound[k] else ""
+        is_compound, is_mod, is_subj, is_obj = flags[k, 1:]
+
         ## chunk 2
-        # if token is a punctuation mark then move on to the next token
-        if tok.dep_ != "punct":
-            # check: token is a compound word or not
-            if tok.dep_ == "compound":
-                prefix = tok.text
-                # if the previous word was also a 'compound' then add the current word to it
-                if prv_tok_dep == "compound":
-                    prefix = prv_tok_text + " " + tok.text
-
-            # check: token is a modifier or not
-            if tok.dep_.endswith("mod") == True:
-                modifier = tok.text
-                # if the previous word was also a 'compound' then add the current word to it
-                if prv_tok_dep == "compound":
-                    modifier = prv_tok_text + " " + tok.text
-
-            ## chunk 3
-            if tok.dep_.find("subj") == True:
-                ent1 = modifier + " " + prefix + " " + tok.text
-                prefix = ""
-                modifier = ""
-                prv_tok_dep = ""
-                prv_tok_text = ""
-
-            ## chunk 4
-            if tok.dep_.find("obj") == True:
-                ent2 = modifier + " " + prefix + " " + tok.text
-
-            ## chunk 5
-            # update variables
-            prv_tok_dep = tok.dep_
-            prv_tok_text = tok.text
+        # check: token is a compound word or not
+        if is_compound:
+            # if the previous word was also a 'compound' then add the current word to it
+            prefix = prv_tok_text + " " + text if prv_compound[k] else text
+
+        # check: token is a modifier or not
+        if is_mod:
+            # if the previous word was also a 'compound' then add the current word to it
+            modifier = prv_tok_text + " " + text if prv_compound[k] else text
+
+        ## chunk 3
+        if is_subj:
+            ent1 = modifier + " " + prefix + " " + text
+            prefix = ""
+            modifier = ""
+
+        ## chunk 4
+        if is_obj:
+            ent2 = modifier + " " + prefix + " " + text
     #############################################################
 
     return [ent1.strip(), ent2.strip()]
@@ -191,41 +206,7 @@ def get_relation(nlp, sent):
             "OP": "+",
         },  # Copula or possessive
         {"IS_ALPHA": True, "OP": "*"},  # Optional adjectives or determiners
-        {
-            "LOWER": {
-                "IN": [
-                    "wife",
-                    "husband",
-                    "brother",
-                    "sister",
-                    "father",
-                    "mother",
-                    "son",
-                    "daughter",
-                    "friend",
-                    "cousin",
-                    "uncle",
-                    "aunt",
-                    "nephew",
-                    "niece",
-                    "grandfather",
-                    "grandmother",
-                    "grandson",
-                    "granddaughter",
-                    "partner",
-                    "lover",
-                    "fiancé",
-                    "fiancée",
-                    "stepfather",
-                    "stepmother",
-                    "stepson",
-                    "stepdaughter",
-                    "stepbrother",
-                    "stepsister",
-                    "in-law",
-                ]
-            }
-        },
+        {"LOWER": {"IN": sorted(relation_lexicon().words("copular_pattern"))}},  # Relation word
         {"IS_PUNCT": True, "OP": "*"},
         {"LOWER": "of", "OP": "?"},
         {"IS_PUNCT": True, "OP": "*"},
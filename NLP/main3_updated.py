@@ -1,9 +1,30 @@
-import spacy, re, csv, os
+import spacy, re, csv, os, json
 from spacy.tokens import Span
+from spacy.symbols import PERSON, VERB
+from spacy.attrs import ENT_TYPE, ENT_IOB, LEMMA, POS, NORM
 from spacy.kb import InMemoryLookupKB
-from spacy.matcher import Matcher
+from spacy.matcher import DependencyMatcher
 from spacy.util import filter_spans
+import numpy as np
 import pandas as pd
+import argparse
+
+from profiling import (profile_stage, timed_component, instrument_pipeline,
+                       write_timing_report, run_profiled)
+from telemetry import ProgressReporter
+from relation_offsets import (BOOKS, MISSING, relation_offsets, offsets_array,
+                              save_offsets)
+from book_store import BookStore
+from pipeline import run_stages
+from relation_aggregate import RelationAggregator
+from relation_store import RelationRecord, RelationStore
+from granularity import write_granularity_tables
+from coref_annotations import ANNOTATIONS_PATH, CorefAnnotations
+from llm_relations import LLMRelationExtractor, relation_candidate
+from local_llm import DEFAULT_URL
+from prefilter import SentencePrefilter
+from relation_lexicon import (relation_lexicon, relation_matcher, relation_hashes,
+                              relation_hash_array, is_compound_tail)
 
 
 # ========== 1. Load the character entity ==========
@@ -16,7 +37,8 @@ def load_entities():
             if not row:
                 continue
             qid, name = row[0], row[1]
-            alias = [a.strip().replace(" ", "").replace(".", "") for a in row[2:] if a.strip()]
+            # row[2] is the alias list; later columns (Gender) are not aliases
+            alias = [a.strip().replace(" ", "").replace(".", "") for a in row[2:3] if a.strip()]
             names[qid] = name.strip().replace(" ", "").replace(".", "")
             aliases[qid] = alias
     return names, aliases
@@ -43,6 +65,7 @@ def get_person_title(span):
     return None
 
 
+@timed_component("title_merger")
 def extend_person_entity(doc):
     new_ents = []
     for ent in doc.ents:
@@ -66,20 +89,54 @@ Span.set_extension("person_title", default="")
 
 
 # ========== 4. Relation word annotation ==========
-def build_reliationships(doc, nlp):
-    matcher = Matcher(nlp.vocab)
-    relationship_terms = [
-        "friend", "friends", "brother", "sister", "daughter", "daughters",
-        "son", "sons", "father", "mother", "wife", "husband", "aunt", "uncle",
-        "niece", "nephew", "cousin", "in-law", "fiancé", "fiancée"
-    ]
-    patterns = [[{"LOWER": rel}] for rel in relationship_terms]
-    matcher.add("RELATIONSHIP", patterns)
-    matches = matcher(doc)
+# token attribute columns read by the rule extractors in one Doc.to_array call
+TOKEN_ATTRS = [ENT_TYPE, ENT_IOB, LEMMA, POS, NORM]
+ENT_TYPE_COL, ENT_IOB_COL, LEMMA_COL, POS_COL, NORM_COL = range(len(TOKEN_ATTRS))
+IOB_BEGIN = 3
+
+
+def token_columns(doc):
+    return doc.to_array(TOKEN_ATTRS)
+
+
+def relation_mask(columns, vocab):
+    """
+    Tokens whose NORM, or LEMMA unless a verb ("coupled", "fathered"), is a
+    spelling of the main1 "sequence" trigger words.
+    """
+    hashes = relation_hash_array(vocab, "sequence")
+    by_lemma = np.isin(columns[:, LEMMA_COL], hashes) & (columns[:, POS_COL] != VERB)
+    return np.isin(columns[:, NORM_COL], hashes) | by_lemma
+
+
+def person_count(columns):
+    """Number of PERSON entities, counted by their B tags."""
+    return int(np.count_nonzero((columns[:, ENT_IOB_COL] == IOB_BEGIN)
+                                & (columns[:, ENT_TYPE_COL] == PERSON)))
+
+
+@timed_component("relation_matcher")
+def build_reliationships(doc, nlp, columns=None):
+    """
+    Tag relation words as RELATIONSHIP entities whose kb_id is the canonical
+    relation word. Tokens are selected by a NumPy mask over their NORM and
+    LEMMA hashes (see relation_mask); Python only visits the hits. The few
+    multi-token spellings ("in-law") go through a PhraseMatcher.
+    """
+    if columns is None:
+        columns = token_columns(doc)
+    canonical = relation_hashes(doc.vocab, "sequence")
     new_ents = list(doc.ents)
-    for _, start, end in matches:
-        span = Span(doc, start, end, label="RELATIONSHIP")
-        new_ents.append(span)
+    for i in np.flatnonzero(relation_mask(columns, doc.vocab)):
+        word = canonical.get(int(columns[i, NORM_COL])) or canonical[int(columns[i, LEMMA_COL])]
+        new_ents.append(Span(doc, int(i), int(i) + 1, label="RELATIONSHIP", kb_id=word))
+    lexicon = relation_lexicon()
+    for _, start, end in relation_matcher(nlp, "sequence", min_tokens=2)(doc):
+        if is_compound_tail(doc, start):
+            continue
+        span = doc[start:end]
+        new_ents.append(Span(doc, start, end, label="RELATIONSHIP",
+                             kb_id=lexicon.canonical_form(span.text)))
     new_ents = filter_spans(new_ents)
     doc.ents = new_ents
     return doc
@@ -131,7 +188,9 @@ def load_knowledge_base(nlp):
                     if a.strip()
                 ]
 
-            kb[qid] = {"name": name, "aliases": aliases}
+            gender = row[3].strip().upper() if len(row) > 3 else ""
+
+            kb[qid] = {"name": name, "aliases": aliases, "gender": gender}
 
     print(f"Loaded {len(kb)} characters from knowledge base.")
     return kb
@@ -139,27 +198,8 @@ def load_knowledge_base(nlp):
 
 
 # ========== 6. text segmentation ==========
-def divide_text_by(nlp, text, by="sentence"):
-    if by == "chapter":
-        return re.split(r"CHAPTER [IVXLC]+", text)
-    elif by == "paragraph":
-        return [p for p in text.split("\n") if len(p.strip()) > 30]
-    elif by == "sentence":
-        return [sent.text for sent in nlp(text).sents]
-    elif by == "100token":
-        sents = [sent.text for sent in nlp(text).sents]
-        chunks, chunk, token_count = [], [], 0
-        for sent in sents:
-            token_count += len(sent.split())
-            chunk.append(sent)
-            if token_count >= 100:
-                chunks.append(" ".join(chunk))
-                chunk, token_count = [], 0
-        if chunk:
-            chunks.append(" ".join(chunk))
-        return chunks
-    else:
-        return [text]
+# chapters, paragraphs, sentences and 100-token buckets come from
+# book_store.BookStore (persisted offset index over the memory-mapped book)
 
 
 # ========== 7. main1：sequence pattern==========
@@ -168,44 +208,38 @@ def extract_relationships_bidirectional(doc, filter_pronoun=False):
    Relation Extraction Based on Entity Order (Improved Version) 
     - Logical core: Person-relationship-Person sequence matching 
     - Do not remove the pronouns (her, his, their); Retain to capture sentence patterns such as "her friend Charlotte" 
-    Automatically standardize relation words to lowercase
+    Returns (relation Span, left PERSON, right PERSON) triples
     """
 
-    # relatiosnship set`
-    REL_WORDS = {
-        "father", "mother", "brother", "sister", "wife", "husband",
-        "son", "daughter", "parent", "aunt", "uncle", "cousin",
-        "nephew", "niece", "in-law", "fiancé", "fiancée",
-        "friend", "lover", "partner", "companion", "relative", "family", "couple"
-    }
-
     # Define the set of pronouns (for subsequent analysis)
     PRONOUNS = {"his", "her", "their", "my", "your", "our", "its", "him", "me", "them", "you"}
 
-    # 🔹 keep PERSON / RELATIONSHIP entities
-    ents = [ent for ent in doc.ents if ent.label_ in ["PERSON", "RELATIONSHIP"]]
+    # 🔹 keep PERSON / RELATIONSHIP entities (label hashes, no string compare)
+    RELATIONSHIP = doc.vocab.strings["RELATIONSHIP"]
+    ents = [ent for ent in doc.ents if ent.label == PERSON or ent.label == RELATIONSHIP]
 
     relationships = []
 
     # Traverse the entities to look for patterns where the relational words are centered
     for i, ent in enumerate(ents):
-        if ent.label_ == "RELATIONSHIP" and ent.text.lower() in REL_WORDS:
+        # RELATIONSHIP entities only come from the relation lexicon (build_reliationships)
+        if ent.label == RELATIONSHIP:
 
             # Find the first PERSON on the left
             left_person = next(
-                (e for e in reversed(ents[:i]) if e.label_ == "PERSON"),
+                (e for e in reversed(ents[:i]) if e.label == PERSON),
                 None
             )
 
             # Find the first PERSON on the right
             right_person = next(
-                (e for e in ents[i + 1:] if e.label_ == "PERSON"),
+                (e for e in ents[i + 1:] if e.label == PERSON),
                 None
             )
 
             if left_person and right_person:
                 relationships.append((
-                    ent.text.lower(),
+                    ent,
                     left_person,
                     right_person
                 ))
@@ -216,249 +250,685 @@ def extract_relationships_bidirectional(doc, filter_pronoun=False):
 
 
 # ========== 8. main2：dependcy paring ==========
-def extract_dependency_relations(doc):
-    REL_WORDS = {
-        "father", "mother", "brother", "sister", "wife", "husband",
-        "son", "daughter", "parent", "aunt", "uncle", "cousin",
-        "nephew", "niece", "in-law", "fiancé", "fiancée", "friend"
-    }
-    PRONOUNS = {"his", "her", "their", "my", "your", "our", "its", "him", "me", "them", "you"}
-    relationships = []
+def _lemma_variants(words):
+    """
+    LEMMA is matched case-sensitively, but capitalised PROPN tokens keep
+    their case as lemma ("Aunt Philips"). Adding the capitalised and upper
+    case spellings matches them like the old token.lemma_.lower() test.
+    """
+    return sorted({v for w in words for v in (w, w.capitalize(), w.upper())})
 
-    for token in doc:
-
-        # ============================================
-        # B. copular: "Jane is Elizabeth’s sister"
-        # ============================================
-        if token.dep_ == "attr" and token.lemma_.lower() in REL_WORDS:
-            subject = [w for w in token.head.lefts if w.dep_ == "nsubj" and w.ent_type_=="PERSON"]
-            possessor = [w for w in token.children if w.dep_ == "poss" and w.ent_type_=="PERSON"]
-
-            if subject and possessor:
-                relationships.append((token.text, str(subject[0]), possessor[0].text))
-
-        # ============================================
-        # C. of-phrase: "sister of Elizabeth"
-        # ============================================
-        if token.lemma_.lower() in REL_WORDS:
-            for child in token.children:
-                if child.dep_ == "prep" and child.text.lower() == "of":
-                    persons = [c for c in child.children if c.ent_type_=="PERSON"]
-                    if persons:
-                        e2 = persons[0]
-                        e1 = token.head if token.head.ent_type_=="PERSON" else None
-                        if e1:
-                            relationships.append((token.text, str(e1), e2.text))
-
-        # ============================================
-        # D. apposition: "Mr Bennet, father of Jane"
-        # ============================================
-        if token.dep_ == "appos" and token.lemma_.lower() in REL_WORDS:
-            head = token.head
-            if head.ent_type_=="PERSON":
-                for child in token.children:
-                    if child.dep_=="prep" and child.text.lower()=="of":
-                        persons = [c for c in child.children if c.ent_type_=="PERSON"]
-                        for e2 in persons:
-                            relationships.append((token.text, head.text, e2.text))
-
-    
-
-        # ============================================
-        # F. NP-modifier: "Elizabeth’s sister Jane"
-        # ============================================
-        if token.lemma_.lower() in REL_WORDS:
-            poss = [c for c in token.children if c.dep_=="poss" and c.ent_type_=="PERSON"]
-            appos = [c for c in token.children if c.dep_=="appos" and c.ent_type_=="PERSON"]
-            if poss and appos:
-                relationships.append((token.text, appos[0].text, poss[0].text))
 
-    return relationships
+def _fill_rel_words(attrs, rel_words):
+    """Replace the "$REL_WORDS" placeholder anywhere inside a RIGHT_ATTRS dict."""
+    if attrs == "$REL_WORDS":
+        return list(rel_words)
+    if isinstance(attrs, dict):
+        return {k: _fill_rel_words(v, rel_words) for k, v in attrs.items()}
+    return attrs
 
 
-# ========== 9. main1 sentence ONLY ==========
-def chapter_parse_relations(sentence_chunks, nlp):
-    all_relationships = []
+def build_dependency_matcher(nlp, path="dependency_patterns.json", rel_words=None):
+    """
+    Compile the relation templates in `path` into one DependencyMatcher.
+    rel_words defaults to the "dependency" trigger words of the relation lexicon
+    and is matched in any of its lower / Capitalised / UPPER case spellings.
+    Returns (matcher, roles, rel_lemmas, min_persons) where roles maps each
+    rule's match_id to the positions of (relation, entity1, entity2) inside
+    the matched token ids. rel_lemmas (LEMMA hashes of rel_words, or None)
+    and min_persons describe what every rule needs, so the extractor can
+    skip docs no rule can match: rel_lemmas is set when every relation node
+    takes its lemma from "$REL_WORDS", min_persons is 2 when every entity
+    node is a PERSON.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+
+    rel_words = _lemma_variants(rel_words or relation_lexicon().words("dependency"))
+    matcher = DependencyMatcher(nlp.vocab)
+    roles = {}
+    lemma_gate, person_gate = True, True
+    for rule in rules:
+        nodes = {node["RIGHT_ID"]: node["RIGHT_ATTRS"] for node in rule["pattern"]}
+        lemma_gate &= nodes[rule["relation"]].get("LEMMA") == {"IN": "$REL_WORDS"}
+        person_gate &= all(nodes[rule[role]].get("ENT_TYPE") == "PERSON"
+                           for role in ("entity1", "entity2"))
+        pattern = [
+            {**node, "RIGHT_ATTRS": _fill_rel_words(node["RIGHT_ATTRS"], rel_words)}
+            for node in rule["pattern"]
+        ]
+        node_ids = [node["RIGHT_ID"] for node in pattern]
+        matcher.add(rule["name"], [pattern])
+        match_id = nlp.vocab.strings[rule["name"]]
+        roles[match_id] = (
+            node_ids.index(rule["relation"]),
+            node_ids.index(rule["entity1"]),
+            node_ids.index(rule["entity2"]),
+        )
+    print(f"Compiled {len(rules)} dependency relation rules from {path}")
+    rel_lemmas = np.array([nlp.vocab.strings.add(w) for w in rel_words], dtype=np.uint64)
+    return matcher, roles, rel_lemmas if lemma_gate else None, 2 if person_gate else 0
+
+
+def build_entity_index(columns, label=PERSON):
+    """
+    Token -> entity lookup from the ENT_IOB / ENT_TYPE columns: entry i is
+    the position in doc.ents of the `label` entity covering token i, or -1.
+    Lets the extractor return "Mr Bingley" rather than the single token the
+    dependency rule landed on.
+    """
+    ordinal = np.cumsum(columns[:, ENT_IOB_COL] == IOB_BEGIN) - 1
+    return np.where(columns[:, ENT_TYPE_COL] == label, ordinal, -1)
 
-    for i, chunk in enumerate(sentence_chunks):
-        doc = nlp(chunk)
-        extend_person_entity(doc)
-        build_reliationships(doc, nlp)
 
-        rels1 = extract_relationships_bidirectional(doc)
-        for rel, e1, e2 in rels1:
-            all_relationships.append((rel, e1, e2))
+def extract_dependency_relations(doc, dep_rules, columns=None):
+    """
+    Single DependencyMatcher pass over the doc. dep_rules is the tuple from
+    build_dependency_matcher, built once at startup; columns is the
+    token_columns array of the doc. Docs without a relation lemma or with
+    too few PERSON entities are rejected by array tests before the matcher
+    runs. The relation word and entities are returned as Spans (with
+    start_char/end_char); entities cover the full PERSON span. The relation
+    Span's kb_id is the canonical relation word, looked up by LEMMA (or NORM) hash.
+    """
+    matcher, roles, rel_lemmas, min_persons = dep_rules
+    if columns is None:
+        columns = token_columns(doc)
+    if rel_lemmas is not None and not np.isin(columns[:, LEMMA_COL], rel_lemmas).any():
+        return []
+    if person_count(columns) < min_persons:
+        return []
+
+    canonical = relation_hashes(doc.vocab)
+    relationships = []
+    ent_index = build_entity_index(columns)
+    ents = doc.ents
+
+    def entity(i):
+        k = ent_index[i]
+        return ents[k] if k >= 0 else doc[i:i + 1]
+
+    # keep the token order of the old per-token loop, then rule order
+    rule_order = {match_id: i for i, match_id in enumerate(roles)}
+    matches = sorted(
+        matcher(doc),
+        key=lambda m: (m[1][roles[m[0]][0]], rule_order[m[0]])
+    )
+    for match_id, token_ids in matches:
+        rel_i, e1_i, e2_i = roles[match_id]
+        rel = token_ids[rel_i]
+        e1, e2 = entity(token_ids[e1_i]), entity(token_ids[e2_i])
+        if e1.start == e2.start:
+            continue
+        # NORM is lower case, so a capitalised lemma ("Aunt") still finds its word
+        word = canonical.get(int(columns[rel, LEMMA_COL])) or canonical.get(int(columns[rel, NORM_COL]), 0)
+        relationships.append((Span(doc, rel, rel + 1, kb_id=word), e1, e2))
+
+    return relationships
 
-        if (i + 1) % 300 == 0:
-            print(f" main1 processed {i+1}/{len(sentence_chunks)} sentences")
 
+# ========== 9. main1 + main2 over one parse ==========
+def extract_sentence_relations(doc, nlp, base, sent_idx, doc_id=0, dep_rules=None,
+                               annotations=None, bucket_idx=-1, candidates=None):
+    """
+    All relations of one parsed sentence of clean_book.txt as RelationRecords.
+    main1 runs on the plain parse; then the coreference annotations are laid
+    over the same Doc (pronouns become PERSON entities carrying a QID) and
+    main2's dependency rules run on it, so no resolved copy of the book is
+    parsed. main2 records keep their 100-token bucket as segment_idx.
+    If no rule fired and the sentence names two people, it is appended to
+    `candidates` (when given) for the LLM relation pass.
+    Token attributes are read once with Doc.to_array; main1 is skipped for
+    sentences with fewer than two PERSON entities, since it needs a person
+    on either side of the relation word.
+    """
+    extend_person_entity(doc)
+    columns = token_columns(doc)
+
+    records = []
+    tagged = person_count(columns) >= 2
+    if tagged:
+        build_reliationships(doc, nlp, columns)
+        records = [
+            RelationRecord(rel.kb_id_ or rel.text.lower(), e1.text, e2.text, "sentence", "main1",
+                           relation_offsets(doc_id, sent_idx, base, rel, e1, e2))
+            for rel, e1, e2 in extract_relationships_bidirectional(doc)
+        ]
+    text_of = annotations.text_of if annotations is not None else (lambda span: span.text)
+    if dep_rules is not None:
+        added = annotations.apply(doc, base) if annotations is not None else 0
+        if tagged or added:
+            # RELATIONSHIP spans and annotated mentions change the entity columns
+            columns[:, [ENT_TYPE_COL, ENT_IOB_COL]] = doc.to_array([ENT_TYPE, ENT_IOB])
+        records += [
+            RelationRecord(rel.kb_id_ or rel.text, text_of(e1), text_of(e2), "100token", "main2",
+                           relation_offsets(doc_id, bucket_idx, base, rel, e1, e2))
+            for rel, e1, e2 in extract_dependency_relations(doc, dep_rules, columns)
+        ]
+    if candidates is not None and not records:
+        candidate = relation_candidate(doc, base, sent_idx, doc_id, text_of)
+        if candidate is not None:
+            candidates.append(candidate)
+    return records
+
+
+def chapter_parse_relations(sentence_chunks, nlp, progress=None, doc_id=0, store=None,
+                            dep_rules=None, annotations=None, buckets=None, candidates=None,
+                            indices=None):
+    """
+    sentence_chunks are (start_char, sentence) pairs from BookStore.chunks. With dep_rules, main2 runs on the
+    same Doc (see extract_sentence_relations); buckets gives the 100-token
+    bucket of every sentence; candidates collects the sentences for the LLM
+    relation pass. indices (e.g. from the prefilter) restricts parsing to
+    those sentences; segment indices stay those of the whole book.
+    Relations are appended to a RelationStore as
+    text + offsets, so every Doc is released after its sentence; the store
+    is returned.
+    """
+    all_relationships = store if store is not None else RelationStore()
+    if indices is None:
+        indices = range(len(sentence_chunks))
+    if progress is None:
+        progress = ProgressReporter("extract", len(indices), metrics_path=None)
+
+    for sent_idx in indices:
+        sent_idx = int(sent_idx)
+        base, chunk = sentence_chunks[sent_idx]
+        doc = nlp(chunk)
+        records = extract_sentence_relations(
+            doc, nlp, base, sent_idx, doc_id, dep_rules, annotations,
+            int(buckets[sent_idx]) if buckets is not None else -1, candidates)
+        for record in records:
+            all_relationships.append(record.rel, record.e1, record.e2,
+                                     record.mode, record.source, record.offsets)
+
+        progress.update(tokens=len(doc), relations=len(records))
+
+    progress.close()
     return all_relationships
 
 
 
 
 # ========== 10. KB reflection ==========
-def consolidate_relationships_entities(relationships, kb, default_mode="sentence"):
+def _clean_kb_key(text):
+    return re.sub(r"[\s\u00A0\u200B]+", "", text) \
+             .replace(".", "").replace("'", "") \
+             .replace('"', "").lower().strip()
+
+
+def build_alias_index(kb):
     """
-    A general consolidate function compatible with 3/4/5 tuples.
-    Automatic
-    - Clean the entity
-    - Match KB
-    Output standardized names
-    Output Mode/Source
+    Precompute the KB lookups once: an exact dict of cleaned name/alias ->
+    (qid, name) and the list used by the substring fallback.
     """
+    exact, fallback = {}, []
+    for qid, entry in kb.items():
+        keys = [_clean_kb_key(entry["name"])] + [_clean_kb_key(a) for a in entry.get("aliases", [])]
+        for key in keys:
+            exact.setdefault(key, (qid, entry["name"]))
+        fallback.append((qid, entry["name"], keys))
+    return exact, fallback
 
-    VALID_REL_WORDS = {
-        "father", "mother", "brother", "sister", "wife", "husband",
-        "son", "daughter", "parent", "aunt", "uncle", "cousin",
-        "nephew", "niece", "friend", "lover", "partner", "companion",
-        "relative", "family", "couple"
-    }
 
-    PRONOUNS = {"his", "her", "their", "my", "your", "our", "its",
-                "him", "me", "them", "you"}
+PRONOUNS = {"his", "her", "their", "my", "your", "our", "its",
+            "him", "me", "them", "you"}
+
+CSV_COLUMNS = ["Relationship", "Entity1", "Entity2", "Entity1_ID", "Entity2_ID", "Mode", "Source"]
 
-    # ========== Clean and display the name ==========
-    def clean_name_display(name):
-        for ch in [".", '"', "'", "!", "\n"]:
-            name = name.replace(ch, "")
-        return name.strip()
 
-    # ========== KB Matching function ==========
+def make_kb_matcher(kb):
+    """
+    Return match_to_kb(ent) -> (qid, standard name), with the alias index
+    built once. Results are memoised per surface string, so each distinct
+    name in the store is matched only once.
+    """
+    exact_index, fallback_index = build_alias_index(kb)
+    memo = {}
+
     def match_to_kb(ent):
 
         raw = ent.text if hasattr(ent, "text") else str(ent)
-        cleaned = re.sub(r"[\s\u00A0\u200B]+", "", raw) \
-                    .replace(".", "").replace("'", "") \
-                    .replace('"', "").lower().strip()
+        if raw not in memo:
+            memo[raw] = _match(raw)
+        return memo[raw]
 
-        for qid, entry in kb.items():
-            name_clean = entry["name"].replace(" ", "").replace(".", "").lower()
-            alias_clean_list = [a.replace(" ", "").replace(".", "").lower()
-                                for a in entry.get("aliases", [])]
+    def _match(raw):
+        cleaned = _clean_kb_key(raw)
 
-            
-            if cleaned == name_clean or cleaned in alias_clean_list:
-                return qid, entry["name"]
+        # exact name/alias match across the whole KB first, so a full span
+        # like "Mr Bennet" never falls through to another Bennet
+        if cleaned in exact_index:
+            return exact_index[cleaned]
 
-            
-            if cleaned in name_clean or any(cleaned in a for a in alias_clean_list):
-                return qid, entry["name"]
+        if cleaned:
+            for qid, name, keys in fallback_index:
+                if any(cleaned in key for key in keys):
+                    return qid, name
 
-        return "N/A", raw  
+        return "N/A", raw
 
-    # ========== Integrated output ==========
-    rows = []
+    return match_to_kb
 
-    for item in relationships:
 
-    
-        if len(item) == 3:
-            rel, ent1, ent2 = item
-            mode_used, source = default_mode, "unknown"
+def link_relationship(item, match_to_kb, default_mode="sentence"):
+    """
+    KB-link one RelationRecord (or legacy 3/4/5/6 tuple). Returns
+    (row dict, offsets) or None when the relation word is not valid or an
+    entity is a bare pronoun.
+    """
+    offsets = MISSING
+    if isinstance(item, RelationRecord):
+        rel, ent1, ent2 = item.rel, item.e1, item.e2
+        mode_used, source, offsets = item.mode, item.source, item.offsets
 
-        elif len(item) == 4:
-            rel, ent1, ent2, source = item
-            mode_used = default_mode
+    elif len(item) == 3:
+        rel, ent1, ent2 = item
+        mode_used, source = default_mode, "unknown"
 
-        elif len(item) == 5:
-            rel, ent1, ent2, mode_used, source = item
+    elif len(item) == 4:
+        rel, ent1, ent2, source = item
+        mode_used = default_mode
 
-        else:
-            print(" Unexpected relationship tuple:", item)
-            continue
+    elif len(item) == 5:
+        rel, ent1, ent2, mode_used, source = item
 
-        # --- Filter out relationships that are not in the dictionary ---
-        if rel.lower() not in VALID_REL_WORDS:
-            continue
+    elif len(item) == 6:
+        rel, ent1, ent2, mode_used, source, offsets = item
 
-        # --- Extract text ---
-        ent1_text = ent1.text if hasattr(ent1, "text") else str(ent1)
-        ent2_text = ent2.text if hasattr(ent2, "text") else str(ent2)
+    else:
+        print(" Unexpected relationship tuple:", item)
+        return None
+
+    # --- Filter out relationships that are not in the dictionary ---
+    if not relation_lexicon().is_relation(rel, "valid"):
+        return None
+
+    # --- Extract text ---
+    ent1_text = ent1.text if hasattr(ent1, "text") else str(ent1)
+    ent2_text = ent2.text if hasattr(ent2, "text") else str(ent2)
+
+    # --- Filtering pronouns ---
+    if ent1_text.lower() in PRONOUNS or ent2_text.lower() in PRONOUNS:
+        return None
+
+    # --- KB reflection ---
+    ent1_id, ent1_std = match_to_kb(ent1)
+    ent2_id, ent2_std = match_to_kb(ent2)
+
+    row = {
+        "Relationship": rel.lower(),
+        "Entity1": ent1_std,
+        "Entity2": ent2_std,
+        "Entity1_ID": ent1_id,
+        "Entity2_ID": ent2_id,
+        "Mode": mode_used,
+        "Source": source
+    }
+    return row, offsets
 
-        # --- Filtering pronouns ---
-        if ent1_text.lower() in PRONOUNS or ent2_text.lower() in PRONOUNS:
-            continue
 
-        # --- KB reflection ---
-        ent1_id, ent1_std = match_to_kb(ent1)
-        ent2_id, ent2_std = match_to_kb(ent2)
-
-        
-        rows.append({
-            "Relationship": rel.lower(),
-            "Entity1": ent1_std,
-            "Entity2": ent2_std,
-            "Entity1_ID": ent1_id,
-            "Entity2_ID": ent2_id,
-            "Mode": mode_used,
-            "Source": source
-        })
+def _recode(codes, values):
+    """Categorical of values[code] per code; values is one entry per interned string."""
+    new_codes, categories = pd.factorize(pd.Series(values, dtype=object))
+    return pd.Categorical.from_codes(new_codes[codes], categories=categories)
 
-    # ========== CSV ==========
-    df = pd.DataFrame(rows)
-    df.to_csv("consolidated_relationships.csv", index=False, encoding="utf-8")
 
-    print(f" Saved {len(df)} relationships → consolidated_relationships.csv")
+def link_store(store, match_to_kb):
+    """
+    link_relationship over a whole RelationStore at once. The relation and
+    pronoun filters and the KB match run once per interned string, and the
+    rows are gathered as codes from RelationStore.to_frame, so no row dict
+    or RelationRecord is built. Returns (DataFrame with the CSV_COLUMNS,
+    offsets array of the kept rows).
+    """
+    frame = store.to_frame()
+    strings = store.strings
+    rel, e1, e2, mode, source = (frame[name].cat.codes.to_numpy()
+                                 for name in ("rel", "e1", "e2", "mode", "source"))
+
+    lexicon = relation_lexicon()
+    valid = np.fromiter((lexicon.is_relation(s, "valid") for s in strings), dtype=bool, count=len(strings))
+    pronoun = np.fromiter((s.lower() in PRONOUNS for s in strings), dtype=bool, count=len(strings))
+    keep = valid[rel] & ~pronoun[e1] & ~pronoun[e2]
+    rel, e1, e2, mode, source = rel[keep], e1[keep], e2[keep], mode[keep], source[keep]
+
+    # KB reflection once per distinct entity string
+    entity_ids = [None] * len(strings)
+    entity_names = [None] * len(strings)
+    for code in np.unique(np.concatenate([e1, e2])):
+        entity_ids[code], entity_names[code] = match_to_kb(strings[code])
+
+    linked = pd.DataFrame({
+        "Relationship": _recode(rel, [s.lower() for s in strings]),
+        "Entity1": _recode(e1, entity_names),
+        "Entity2": _recode(e2, entity_names),
+        "Entity1_ID": _recode(e1, entity_ids),
+        "Entity2_ID": _recode(e2, entity_ids),
+        "Mode": _recode(mode, strings),
+        "Source": _recode(source, strings),
+    })
+    return linked, store.offsets()[keep]
+
+
+def consolidate_relationships_entities(relationships, kb, default_mode="sentence", progress=None,
+                                       raw_evidence=True, keep_evidence=False):
+    """
+    A general consolidate function for a RelationStore, or any list of
+    3/4/5/6 tuples (6-tuples carry a relation_offsets row as the last item).
+    Automatic
+    - Clean the entity
+    - Match KB
+    Output standardized names
+    Output Mode/Source
+    Writes the aggregated counts to relationship_aggregate.csv and, with
+    raw_evidence, every mention to consolidated_relationships.csv.
+    Returns the RelationAggregator; with raw_evidence or keep_evidence it
+    also holds every linked row and its offsets.
+    A RelationStore is linked column-wise by link_store.
+    """
+    match_to_kb = make_kb_matcher(kb)
 
+    # ========== Integrated output ==========
+    aggregator = RelationAggregator(keep_evidence=raw_evidence or keep_evidence)
+    if progress is None:
+        progress = ProgressReporter("kb_link", len(relationships), unit="relations",
+                                    metrics_path=None)
+
+    with profile_stage("kb_matching"):
+        if isinstance(relationships, RelationStore):
+            linked, offsets = link_store(relationships, match_to_kb)
+            hits = int((linked["Entity1_ID"] != "N/A").sum() + (linked["Entity2_ID"] != "N/A").sum())
+            progress.update(len(relationships), relations=len(linked),
+                            kb_lookups=2 * len(linked), kb_hits=hits)
+            aggregator.add_frame(linked, offsets)
+        else:
+            for item in relationships:
+                linked = link_relationship(item, match_to_kb, default_mode)
+                if linked is None:
+                    progress.update()
+                    continue
 
+                row, offsets = linked
+                progress.update(relations=1, kb_lookups=2,
+                                kb_hits=(row["Entity1_ID"] != "N/A") + (row["Entity2_ID"] != "N/A"))
+                aggregator.add(row, offsets)
 
-# ========== 11. main function ==========
-def main():
-    print("Loading spaCy model...")
-    nlp = spacy.load("en_core_web_lg")
+    progress.close()
 
-    print("===================================================")
-    print("Loading original text (for main1 sequential)...")
-    with open("clean_book.txt", "r", encoding="utf-8") as f:
-        text_original = f.read()
+    # ========== CSV ==========
+    with profile_stage("write_csv"):
+        aggregator.write("relationship_aggregate.csv")
+        if raw_evidence:
+            # row i of the offsets array is row i of the CSV
+            aggregator.write_evidence("consolidated_relationships.csv",
+                                      "consolidated_relationships_offsets.npy", CSV_COLUMNS)
+    return aggregator
 
-    print("Loading coreference-resolved text (for main2 dep)...")
-    with open("resolved_book.txt", "r", encoding="utf-8") as f:
-        text_resolved = f.read()
 
-    print("===================================================")
-    print("Loading Knowledge Base...")
-    kb = load_knowledge_base(nlp)
 
-    # ============================
-    # main1: sequential, raw text
-    # ============================
+# ========== 11. staged pipeline ==========
+def make_prefilter(kb, args):
+    """
+    SentencePrefilter over the spellings of the main1 and main2 trigger
+    words, or None with --no-prefilter. --prefilter-aliases also requires a
+    KB alias word, which is faster but can skip relations main1/main2 would
+    find (see SentencePrefilter). The LLM pass needs the sentences without a
+    trigger too, so with --llm-relations only the alias test is applied, and
+    without it there is nothing to filter.
+    """
+    if not args.prefilter:
+        return None
+    lexicon = relation_lexicon()
+    triggers = set(lexicon.spellings("sequence")) | set(lexicon.spellings("dependency"))
+    if args.prefilter_aliases:
+        return SentencePrefilter.from_kb(kb, triggers,
+                                         require_trigger=not args.llm_relations)
+    if args.llm_relations:
+        return None
+    return SentencePrefilter(triggers)
+
+
+def make_llm_extractor(args):
+    """LLMRelationExtractor for --llm-relations, else None."""
+    if not getattr(args, "llm_relations", False):
+        return None
+    return LLMRelationExtractor(relation_lexicon().words("valid"), url=args.llm_url, model=args.llm_model,
+                                batch_size=args.llm_batch_size)
+
+
+def run_pipelined(nlp, kb, dep_rules, book_original, annotations, reporter, args):
+    """
+    Same output as the sequential extract + consolidate path, but the
+    stages run concurrently with bounded queues between them:
+      read (mmap slices) -> parse (nlp.pipe, n_process workers)
+        -> extract (title merge, relation matcher, main1 + coref layer + main2)
+        -> link (KB matching) -> write (streamed CSV, main thread)
+    """
+    # sentence offsets need the one-off parse before the stages start
+    starts, ends = book_original.bounds("sentence", nlp)
+    buckets = book_original.locate("100token", starts, nlp)
+    original_id = BOOKS.index("clean_book.txt")
+    indices = range(len(starts))
+    prefilter = make_prefilter(kb, args)
+    if prefilter is not None:
+        # the prefilter reads the slices once up front; read() slices again
+        # lazily, which costs a memcpy per kept sentence
+        indices = prefilter.select(
+            [(int(s), book_original.slice(s, e)) for s, e in zip(starts, ends)], annotations)
+        print(prefilter.report())
+    progress = reporter("extract", len(indices))
+    link_progress = reporter("kb_link", 0, unit="relations")
+    llm = make_llm_extractor(args)
+    candidates = [] if llm is not None else None
+
+    def read():
+        for idx in indices:
+            start, end = starts[idx], ends[idx]
+            yield int(idx), int(start), book_original.slice(start, end)
+
+    def parse(items):
+        return nlp.pipe(((text, (idx, base)) for idx, base, text in items),
+                        as_tuples=True, n_process=args.n_process, batch_size=args.batch_size)
+
+    def extract(docs):
+        for doc, (idx, base) in docs:
+            labeled = extract_sentence_relations(doc, nlp, base, idx, original_id, dep_rules,
+                                                 annotations, int(buckets[idx]), candidates)
+            # only text records leave this stage, so the Doc can be freed
+            progress.update(tokens=len(doc), relations=len(labeled))
+            yield labeled
+
+    match_to_kb = make_kb_matcher(kb)
+
+    def link(batches):
+        for batch in batches:
+            linked = []
+            for item in batch:
+                result = link_relationship(item, match_to_kb, default_mode="mixed")
+                if result is None:
+                    link_progress.update()
+                    continue
+                row = result[0]
+                link_progress.update(relations=1, kb_lookups=2,
+                                     kb_hits=(row["Entity1_ID"] != "N/A") + (row["Entity2_ID"] != "N/A"))
+                linked.append(result)
+            yield linked
+
+    stages = [("parse", parse), ("extract", extract), ("link", link)]
+    aggregator = RelationAggregator(keep_evidence=args.all_granularities)
+    offset_rows = []
+    raw_path = "consolidated_relationships.csv" if args.raw_evidence else os.devnull
+    with open(raw_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+
+        def emit(linked):
+            for row, offsets in linked:
+                aggregator.add(row, offsets)
+                if args.raw_evidence:
+                    writer.writerow(row)
+                    offset_rows.append(offsets)
+
+        for linked in run_stages(read(), stages, maxsize=args.queue_size):
+            emit(linked)
+        if llm is not None:
+            # the candidate list is complete once the stages are drained
+            for linked in link([llm.extract(candidates)]):
+                emit(linked)
+
+    progress.close()
+    link_progress.close()
+    aggregator.write("relationship_aggregate.csv")
+    if args.raw_evidence:
+        save_offsets("consolidated_relationships_offsets.npy", offsets_array(offset_rows))
+        print(f" Saved {len(offset_rows)} raw relations → consolidated_relationships.csv"
+              f" (+ consolidated_relationships_offsets.npy)")
+    return aggregator
+
+
+def write_all_granularities(aggregator, book_original, nlp):
+    """results/*_by_{sentence,paragraph,chapter,100token} from this single run."""
     print("===================================================")
-    print("Extracting main1 relationships from ORIGINAL text (sentence mode)...")
-    chunks_main1 = divide_text_by(nlp, text_original, by="sentence")
-    print(f"main1: {len(chunks_main1)} sentences")
+    print("Writing sentence / paragraph / chapter / 100-token tables...")
+    stores = {BOOKS.index("clean_book.txt"): book_original}
+    with profile_stage("granularity_tables"):
+        write_granularity_tables(aggregator.evidence_frame(CSV_COLUMNS),
+                                 aggregator.evidence_offsets_array(), stores, nlp)
+
+
+# ========== 12. main function ==========
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Extract character relationships (main1 + main2).")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], default=None,
+                        help="capture a full profile of the run into results/")
+    parser.add_argument("--timing-report", default="results/timing_report.json",
+                        help="where to write the per-stage/per-component timing JSON")
+    parser.add_argument("--metrics-path", default="results/metrics.jsonl",
+                        help="progress/throughput telemetry file")
+    parser.add_argument("--metrics-format", choices=["jsonl", "prom"], default="jsonl",
+                        help="JSON lines, or a Prometheus textfile-collector file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between telemetry snapshots")
+    parser.add_argument("--dependency-patterns", default="dependency_patterns.json",
+                        help="JSON file with the main2 DependencyMatcher relation templates")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="run read/parse/extract/link/write as concurrent stages")
+    parser.add_argument("--n-process", type=int, default=1,
+                        help="spaCy worker processes for the parse stage (--pipelined)")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="nlp.pipe batch size for the parse stage (--pipelined)")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="bound of each inter-stage queue (--pipelined)")
+    parser.add_argument("--no-raw-evidence", dest="raw_evidence", action="store_false",
+                        help="only write relationship_aggregate.csv, not every raw mention")
+    parser.add_argument("--all-granularities", action="store_true",
+                        help="also write every results/*_by_<granularity> table from this run")
+    parser.add_argument("--coref-annotations", default=ANNOTATIONS_PATH,
+                        help="coreference annotation file laid over the parse for main2")
+    parser.add_argument("--llm-relations", action="store_true",
+                        help="ask a local LLM about sentences naming two people where no rule fired")
+    parser.add_argument("--llm-url", default=DEFAULT_URL,
+                        help="OpenAI-compatible chat endpoint of the local model server")
+    parser.add_argument("--llm-model", default="local")
+    parser.add_argument("--llm-batch-size", type=int, default=20,
+                        help="candidate sentences per LLM prompt")
+    parser.add_argument("--no-prefilter", dest="prefilter", action="store_false",
+                        help="parse every sentence, not only those with a relation word")
+    parser.add_argument("--prefilter-aliases", action="store_true",
+                        help="also skip sentences without a KB alias word (faster, may lose relations)")
+    return parser
+
+
+def main(args=None):
+    if args is None:
+        args = build_arg_parser().parse_args([])
+
+    def reporter(stage, total, unit="sentences"):
+        return ProgressReporter(stage, total, unit=unit, interval=args.metrics_interval,
+                                metrics_path=args.metrics_path, fmt=args.metrics_format)
+
+    with profile_stage("load_model"):
+        print("Loading spaCy model...")
+        nlp = spacy.load("en_core_web_lg")
+        instrument_pipeline(nlp, n_process=args.n_process if args.pipelined else 1)
+        dep_rules = build_dependency_matcher(nlp, args.dependency_patterns)
 
-    rels_main1 = chapter_parse_relations(chunks_main1, nlp)
-    rels_main1_labeled = [(r[0], r[1], r[2], "sentence", "main1") for r in rels_main1]
-    print(f"✔ main1 extracted {len(rels_main1_labeled)} relations")
+    print("===================================================")
+    with profile_stage("read_text"):
+        print("Mapping original text...")
+        book_original = BookStore("clean_book.txt")
+
+        annotations = None
+        if os.path.exists(args.coref_annotations):
+            annotations = CorefAnnotations(args.coref_annotations)
+            print(f"Loaded {len(annotations)} coreference mentions from {args.coref_annotations}")
+        else:
+            print(f"⚠️ {args.coref_annotations} not found; main2 runs without coreference "
+                  f"(run co_reference resolution.py first)")
 
+    print("===================================================")
+    with profile_stage("load_kb"):
+        print("Loading Knowledge Base...")
+        kb = load_knowledge_base(nlp)
+
+    if args.pipelined:
+        print("===================================================")
+        print("Running main1 + main2 + KB linking as a staged pipeline...")
+        with profile_stage("pipeline"):
+            aggregator = run_pipelined(nlp, kb, dep_rules, book_original, annotations,
+                                       reporter, args)
+        if args.all_granularities:
+            write_all_granularities(aggregator, book_original, nlp)
+        print("===================================================")
+        write_timing_report(args.timing_report)
+        print("DONE!")
+        return
 
     # ============================
-    # main2: dependency, COREF text
+    # main1 + main2: one parse of the original text
+    # (main2 sees the coreference annotations as a layer on that parse)
     # ============================
     print("===================================================")
-    print("Extracting main2 relationships from COREFERENCE text (100-token)...")
-    chunks_main2 = divide_text_by(nlp, text_resolved, by="100token")
-    print(f" main2: {len(chunks_main2)} chunks")
-
-    rels_main2 = []
-    for i, chunk in enumerate(chunks_main2):
-        doc = nlp(chunk)
-        extend_person_entity(doc)
-        build_reliationships(doc, nlp)
-        rels = extract_dependency_relations(doc)
-        rels_main2.extend([(r[0], r[1], r[2], "100token", "main2") for r in rels])
-        if (i+1) % 10 == 0:
-            print(f" processed {i+1}/{len(chunks_main2)} chunks")
-
-    print(f" main2 extracted {len(rels_main2)} relations")
+    print("Extracting main1 (sequence) + main2 (dependency) relationships from ORIGINAL text...")
+    with profile_stage("segment"):
+        chunks = book_original.chunks("sentence", nlp)
+        buckets = book_original.locate("100token", [base for base, _ in chunks], nlp)
+    print(f"{len(chunks)} sentences")
+
+    indices = None
+    prefilter = make_prefilter(kb, args)
+    if prefilter is not None:
+        with profile_stage("prefilter"):
+            indices = prefilter.select(chunks, annotations)
+        print(prefilter.report())
+
+    all_relationships = RelationStore()
+    llm = make_llm_extractor(args)
+    candidates = [] if llm is not None else None
+    with profile_stage("extract"):
+        chapter_parse_relations(chunks, nlp,
+                                progress=reporter("extract", len(chunks) if indices is None else len(indices)),
+                                doc_id=BOOKS.index("clean_book.txt"),
+                                store=all_relationships,
+                                dep_rules=dep_rules, annotations=annotations,
+                                buckets=buckets, candidates=candidates, indices=indices)
+    n_main2 = int(np.sum(all_relationships.columns()["source"] == all_relationships.intern("main2")))
+    print(f"✔ main1 extracted {len(all_relationships) - n_main2} relations")
+    print(f" main2 extracted {n_main2} relations")
+
+    if llm is not None:
+        print("===================================================")
+        print("Asking the local LLM about sentences the rules missed...")
+        with profile_stage("llm_relations"):
+            for record in llm.extract(candidates):
+                all_relationships.append(record.rel, record.e1, record.e2,
+                                         record.mode, record.source, record.offsets)
 
 
     # ============================
-    # Merge results
+    # Merged results (one store)
     # ============================
-    all_relationships = rels_main1_labeled + rels_main2
     print("==================================================")
     print(f"TOTAL merged relationships: {len(all_relationships)}")
 
@@ -467,10 +937,21 @@ def main():
     # ============================
     print("===================================================")
     print(" Consolidating results with KB...")
-    consolidate_relationships_entities(all_relationships, kb, default_mode="mixed")
+    with profile_stage("consolidate"):
+        aggregator = consolidate_relationships_entities(
+            all_relationships, kb, default_mode="mixed",
+            progress=reporter("kb_link", len(all_relationships), unit="relations"),
+            raw_evidence=args.raw_evidence, keep_evidence=args.all_granularities)
+
+    if args.all_granularities:
+        write_all_granularities(aggregator, book_original, nlp)
+
+    print("===================================================")
+    write_timing_report(args.timing_report)
 
     print("DONE!")
 
 
 if __name__ == "__main__":
-    main()
+    args = build_arg_parser().parse_args()
+    run_profiled(lambda: main(args), mode=args.profile)
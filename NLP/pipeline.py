@@ -0,0 +1,115 @@
+import queue, threading, time
+
+from profiling import add_timing
+
+
+_DONE = object()
+# how often a blocked put/get re-checks the cancel flag
+POLL_SECONDS = 0.1
+
+
+# ========== 1. Stage plumbing ==========
+class _StageQueue:
+    """
+    Bounded queue between two stages; put() blocks when full (backpressure).
+    Once the shared cancel event is set, put() drops its item and iteration
+    stops, so queued items are discarded rather than processed.
+    """
+
+    def __init__(self, name, maxsize, cancel):
+        self.name = name
+        self.q = queue.Queue(maxsize=maxsize)
+        self.cancel = cancel
+        self.wait_seconds = 0.0
+
+    def put(self, item):
+        while not self.cancel.is_set():
+            try:
+                self.q.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        while not self.cancel.is_set():
+            start = time.perf_counter()
+            try:
+                item = self.q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            finally:
+                self.wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            yield item
+
+
+def _feed(source, outbox, errors, cancel):
+    try:
+        for item in source:
+            if cancel.is_set():
+                break
+            outbox.put(item)
+    except BaseException as e:
+        errors.append(("source", e))
+        cancel.set()
+    finally:
+        outbox.put(_DONE)
+
+
+def _run_stage(name, fn, inbox, outbox, errors, cancel):
+    start = time.perf_counter()
+    count = 0
+    try:
+        for out in fn(inbox):
+            if cancel.is_set():
+                break
+            outbox.put(out)
+            count += 1
+    except BaseException as e:
+        errors.append((name, e))
+        cancel.set()
+    finally:
+        outbox.put(_DONE)
+        # busy time = wall time of the stage minus time spent waiting for input
+        busy = time.perf_counter() - start - inbox.wait_seconds
+        add_timing(f"pipeline_{name}", busy, calls=count)
+
+
+# ========== 2. Runner ==========
+def run_stages(source, stages, maxsize=64):
+    """
+    Run `stages` concurrently, each in its own thread, connected by bounded
+    queues. `source` is any iterable; each stage is (name, fn) where fn takes
+    an iterable of inputs and yields outputs (so a stage can batch, e.g.
+    nlp.pipe). Yields the outputs of the last stage. A stage error, or the
+    consumer stopping early (break, exception, close()), sets a shared
+    cancel event: every stage stops after its current item or batch and
+    queued items are dropped. A stage error is then re-raised here.
+    """
+    errors = []
+    cancel = threading.Event()
+    inbox = _StageQueue("source", maxsize, cancel)
+    threads = [threading.Thread(target=_feed, args=(source, inbox, errors, cancel),
+                                name="stage-source", daemon=True)]
+    for name, fn in stages:
+        outbox = _StageQueue(name, maxsize, cancel)
+        threads.append(threading.Thread(target=_run_stage,
+                                        args=(name, fn, inbox, outbox, errors, cancel),
+                                        name=f"stage-{name}", daemon=True))
+        inbox = outbox
+
+    for t in threads:
+        t.start()
+    exhausted = False
+    try:
+        yield from inbox
+        exhausted = True
+    finally:
+        if not exhausted:
+            cancel.set()
+        for t in threads:
+            t.join()
+    if errors:
+        name, exc = errors[0]
+        raise RuntimeError(f"pipeline stage '{name}' failed") from exc
@@ -1,8 +1,15 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import igraph as ig
 import os
-from itertools import chain
+
+from render import render_graph, top_k_edges, label_plot_kwargs
+from graph_store import export_graph
+from graph_analytics import write_character_metrics
+
+from relation_aggregate import canonical_relation
+from vocabulary import Vocabulary
+from relation_tensor import RelationTensor
 
 
 def load_names():
@@ -22,128 +29,158 @@ def load_names():
 # ======================================================
 #  PROCESS DATA
 # ======================================================
-def process_data():
-    input_path = "consolidated_relationships.csv"  # ✅ 修正文件名
+def summarize_relationships(df, name_dict):
+    """
+    Relation rows (Relationship / Entity1_ID / Entity2_ID, optional Count)
+    → (sparse tensor, relationships_with_counts table, pivot export).
+    Rows without a Count column are raw mentions and get canonicalised here.
+    """
+    df = df.dropna(subset=["Entity1_ID", "Entity2_ID", "Relationship"])
+    ids1 = df["Entity1_ID"].astype(str).str.strip()
+    ids2 = df["Entity2_ID"].astype(str).str.strip()
+    aggregated = "Count" in df.columns
+    counts = df["Count"].to_numpy() if aggregated else np.ones(len(df), dtype=np.int64)
+
+    # 🔹 QID / 关系类型 → 小整数 (字符串只在输出时还原)
+    relationship = df["Relationship"].astype(str)
+    if not aggregated:
+        # 标准化 Relationship (聚合表在抽取时已经标准化)
+        relationship = relationship.map(canonical_relation)
+    #    不在 KB 里的 ID (未链接的 "N/A") 也编号, 这些行照旧保留
+    vocab = Vocabulary.from_kb(name_dict, relations=sorted(pd.unique(relationship)),
+                               extra_qids=pd.unique(pd.concat([ids1, ids2])))
+
+    e1 = vocab.qids.encode_array(ids1)
+    e2 = vocab.qids.encode_array(ids2)
+    rel = vocab.relations.encode_array(relationship)
+    keep = e1 != e2
+
+    # 🔹 创建无向 pair (QID 按字典序编号, 所以 min/max 就是排序后的 pair)
+    #    稀疏张量 (角色 × 角色 × 关系类型) 是核心聚合结构
+    tensor = RelationTensor(
+        np.minimum(e1, e2)[keep], np.maximum(e1, e2)[keep], rel[keep],
+        counts[keep], vocab.qids.values, vocab.relations.values,
+    )
+
+    # 🔹 各类计数 (每个非零元素一行, pair 统计按 run 展开)
+    runs = tensor.pair_unique_relations()
+    id1 = vocab.qids.decode(tensor.e1)
+    id2 = vocab.qids.decode(tensor.e2)
+    out = pd.DataFrame({
+        "sorted_pair": format_pairs(id1, id2),
+        "Relationship": vocab.relations.categorical(tensor.rel),
+        "relationship_type_count": tensor.counts,
+        "total_relationship_count": np.repeat(tensor.pair_totals(), runs),
+        "unique_relationship_types": np.repeat(runs, runs),
+        "Entity1_ID": id1,
+        "Entity2_ID": id2,
+    })
+    out["Entity1"] = out["Entity1_ID"].map(name_dict)
+    out["Entity2"] = out["Entity2_ID"].map(name_dict)
+
+    # 🔹 dense pivot 汇总 (只作为导出格式)
+    pivot = tensor.to_pivot(format_pairs)
+    return tensor, out, pivot
+
+
+def process_data(input_path=None, suffix=""):
+    # 🔹 优先使用 main3 写出的聚合表 (relationship_aggregate.csv, 带 Count 列)
+    if input_path is None:
+        input_path = ("relationship_aggregate.csv"
+                      if os.path.exists("relationship_aggregate.csv")
+                      else "consolidated_relationships.csv")
     if not os.path.exists(input_path):
         print(f"❌ Error: {input_path} not found in current directory.")
         return
 
     df = pd.read_csv(input_path, encoding="utf-8")
-    df = df.dropna(subset=["Entity1_ID", "Entity2_ID", "Relationship"])
+    tensor, out, pivot = summarize_relationships(df, load_names())
+    save_summary(tensor, out, pivot, suffix)
 
-    df["Entity1_ID"] = df["Entity1_ID"].astype(str).str.strip()
-    df["Entity2_ID"] = df["Entity2_ID"].astype(str).str.strip()
-    df = df[df["Entity1_ID"] != df["Entity2_ID"]]
-
-    # 🔹 标准化 Relationship
-    def standardize_relationship(relationship):
-        if not isinstance(relationship, str):
-            return relationship
-        relationship = relationship.lower().strip()
-        mapping = {
-            "friends": "friend",
-            "daughters": "daughter",
-            "sons": "son",
-            "brothers": "brother",
-            "sisters": "sister",
-            "parents": "parent",
-            "couples": "couple",
-            "wives": "wife",
-            "husbands": "husband",
-            "fathers": "father",
-            "mothers": "mother",
-        }
-        return mapping.get(relationship, relationship)
-
-    df["Relationship"] = df["Relationship"].apply(standardize_relationship)
-
-    # 🔹 创建无向 pair
-    df["sorted_pair"] = df.apply(
-        lambda r: tuple(sorted([r["Entity1_ID"], r["Entity2_ID"]])), axis=1
-    )
-
-    # 🔹 各类计数
-    rel_type_counts = (
-        df.groupby(["sorted_pair", "Relationship"])
-        .size()
-        .reset_index(name="relationship_type_count")
-    )
-    total_counts = (
-        df.groupby("sorted_pair")
-        .size()
-        .reset_index(name="total_relationship_count")
-    )
-    unique_counts = (
-        df.groupby("sorted_pair")["Relationship"]
-        .nunique()
-        .reset_index(name="unique_relationship_types")
-    )
 
-    # 🔹 合并统计
-    df_final = rel_type_counts.merge(total_counts, on="sorted_pair", how="left")
-    df_final = df_final.merge(unique_counts, on="sorted_pair", how="left")
-    #df_final.drop_duplicates(inplace=True)
-
-    # 🔹 拆分 Entity ID
-    df_final[["Entity1_ID", "Entity2_ID"]] = df_final["sorted_pair"].apply(
-        lambda x: pd.Series(eval(str(x)))
-    )
-
-    # 🔹 映射人名
-    name_dict = load_names()
-    df_final["Entity1"] = df_final["Entity1_ID"].map(name_dict)
-    df_final["Entity2"] = df_final["Entity2_ID"].map(name_dict)
+def save_summary(tensor, out, pivot, suffix=""):
+    """Write the tensor, counts table and pivot to results/ (suffix e.g. "_by_chapter")."""
+    os.makedirs("results", exist_ok=True)
+    tensor_path = f"results/relationship_tensor{suffix}.npz"
+    tensor.save(tensor_path)
 
     # 🔹 保存结果
-    os.makedirs("results", exist_ok=True)
-    counts_path = "results/relationships_with_counts.csv"
-    df_final.to_csv(counts_path, index=False, encoding="utf-8")
-
-    # 🔹 生成 pivot 汇总
-    pivot = (
-        df.pivot_table(
-            index="sorted_pair",
-            columns="Relationship",
-            values="Entity1_ID",
-            aggfunc="count",
-            fill_value=0,
-        )
-        .reset_index()
-    )
-    pivot_path = "results/relationship_pivot_summary.csv"
+    counts_path = f"results/relationships_with_counts{suffix}.csv"
+    out.to_csv(counts_path, index=False, encoding="utf-8")
+
+    pivot_path = f"results/relationship_pivot_summary{suffix}.csv"
     pivot.to_csv(pivot_path, index=False, encoding="utf-8")
 
+    print(f"✅ Saved: {tensor_path} ({tensor.nnz} non-zeros, shape {tensor.shape})")
     print(f"✅ Saved: {counts_path}")
     print(f"✅ Saved: {pivot_path}")
-    print(f"✅ Total pairs processed: {len(df_final)}")
+    print(f"✅ Total pairs processed: {len(out)}")
+
+
+def format_pairs(id1, id2):
+    """('Q0001', 'Q0002') strings, the sorted_pair format of the CSVs."""
+    pairs = "('" + pd.Series(id1, dtype=object) + "', '" + pd.Series(id2, dtype=object) + "')"
+    return pairs.to_numpy()
+
+
+def parse_pairs(sorted_pair, vocab):
+    """
+    Vectorised inverse of format_pairs → two int id arrays. Ids missing
+    from vocab (unlinked "N/A") are added to it; unparseable pairs are -1.
+    """
+    parts = sorted_pair.str.extract(r"'([^']*)',\s*'([^']*)'")
+    return (vocab.qids.encode_array(parts[0], grow=True),
+            vocab.qids.encode_array(parts[1], grow=True))
 
 
 # ======================================================
 #  DRAW GRAPH
 # ======================================================
-import pandas as pd
-import matplotlib.pyplot as plt
-import igraph as ig
-import os
-from itertools import chain
-
-def draw_graph():
+def load_dominant_edges(name_dict):
+    """
+    Per character pair: (QID, QID, main relationship, strength) arrays.
+    Read from the sparse tensor when process_data saved one, otherwise
+    from the dense pivot CSV. Returns None when neither exists.
+    """
+    tensor_path = "results/relationship_tensor.npz"
     pivot_path = "results/relationship_pivot_summary.csv"
+    if os.path.exists(tensor_path):
+        tensor = RelationTensor.load(tensor_path)
+        e1, e2, rel, strength = tensor.dominant_relation()
+        qids = np.asarray(tensor.qids, dtype=object)
+        relations = np.asarray(tensor.relations, dtype=object)
+        return qids[e1], qids[e2], relations[rel], strength
+
     if not os.path.exists(pivot_path):
+        return None
+    df = pd.read_csv(pivot_path)
+    vocab = Vocabulary.from_kb(name_dict)
+    src, dst = parse_pairs(df["sorted_pair"], vocab)
+    valid = (src >= 0) & (dst >= 0)
+    relation_cols = df.columns[1:]
+    counts = df.loc[valid, relation_cols].apply(
+        pd.to_numeric, errors="coerce"
+    ).fillna(0).to_numpy(dtype=np.int64)
+    return (vocab.qids.decode(src[valid]), vocab.qids.decode(dst[valid]),
+            np.asarray(relation_cols, dtype=object)[counts.argmax(axis=1)],
+            counts.max(axis=1))
+
+
+def draw_graph(image_path="results/character_relationships_weighted.png", top_k=None):
+    name_dict = load_names()
+    edges = load_dominant_edges(name_dict)
+    if edges is None:
         print("⚠️ Please run process_data() first.")
         return
+    src, dst, main_rel, strength = edges
+    vertex_ids = np.unique(np.concatenate([src, dst]))  # sorted QIDs
 
-    # === 1️⃣ 读取透视表 ===
-    df = pd.read_csv(pivot_path)
-    pairs = df["sorted_pair"].apply(eval)
-    all_ids = list(set(chain.from_iterable(pairs)))
-
-    # === 2️⃣ 构建图节点 ===
-    g = ig.Graph(directed=False)
-    g.add_vertices(all_ids)
+    # === 2️⃣ 构建图节点 (顶点编号 = vertex_ids 中的位置) ===
+    g = ig.Graph(n=len(vertex_ids), directed=False)
+    all_ids = list(vertex_ids)
+    g.vs["name"] = all_ids
 
     # 加载角色名
-    name_dict = load_names()
     g.vs["label"] = [name_dict.get(i, i) for i in all_ids]
 
     # === 3️⃣ 节点大小 ∝ 出现频率 ===
@@ -170,21 +207,13 @@ def draw_graph():
         v_sizes = [min_size for _ in mentions]
     g.vs["size"] = v_sizes
 
-    # === 4️⃣ 计算每条边的主要关系 + 强度 ===
-    relation_cols = df.columns[1:]
-    df[relation_cols] = df[relation_cols].apply(
-        pd.to_numeric, errors="coerce"
-    ).fillna(0).astype(int)
-    df["main_relationship"] = df[relation_cols].idxmax(axis=1)
-    df["relation_strength"] = df[relation_cols].max(axis=1)
-
-    # === 5️⃣ 添加边（带关系+权重） ===
-    for _, row in df.iterrows():
-        e1, e2 = eval(row["sorted_pair"])
-        rel = row["main_relationship"]
-        weight = int(row["relation_strength"]) if not pd.isna(row["relation_strength"]) else 1
-        if e1 in all_ids and e2 in all_ids:
-            g.add_edge(e1, e2, relationship=rel, weight=weight, use_vids=False)
+    # === 4️⃣/5️⃣ 一次性添加所有边（主要关系+强度） ===
+    g.add_edges(list(zip(np.searchsorted(vertex_ids, src).tolist(),
+                         np.searchsorted(vertex_ids, dst).tolist())))
+    g.es["relationship"] = list(main_rel)
+    g.es["weight"] = strength.tolist()
+    if top_k:
+        g = top_k_edges(g, top_k)  # 大图只保留每个角色最强的 k 条边
 
     # === 6️⃣ 边宽度 ∝ 关系强度 ===
     weights = g.es["weight"]
@@ -196,27 +225,33 @@ def draw_graph():
     else:
         e_widths = [min_w for _ in weights]
 
-    # === 7️⃣ 绘图 ===
-    fig, ax = plt.subplots(figsize=(12, 12))
-    ig.plot(
+    # === 7️⃣ 绘图 (Agg 后端, 布局按图哈希缓存) ===
+    render_graph(
         g,
-        target=ax,
-        layout=g.layout("fruchterman_reingold"),
+        image_path,
+        title="Character Relationship Network (Weighted by Mentions & Frequency)",
         vertex_size=g.vs["size"],
         vertex_color="lightblue",
-        vertex_label=g.vs["label"],
         vertex_label_size=8,
-        edge_label=[rel for rel in g.es["relationship"]],
         edge_label_size=6,
         edge_color="gray",
         edge_width=e_widths,
+        **label_plot_kwargs(g),  # 边标签只在小图上画
+    )
+
+    # === 8️⃣ 保存图结构 (GML 流式写出 + 二进制边表) ===
+    paths = export_graph(
+        "results/character_relationships_weighted",
+        g.vs["name"],
+        *zip(*g.get_edgelist()),
+        node_attrs={"label": g.vs["label"], "size": g.vs["size"]},
+        edge_attrs={"relationship": g.es["relationship"], "weight": g.es["weight"]},
+        formats=(".gml", ".npz"),
     )
-    plt.title("Character Relationship Network (Weighted by Mentions & Frequency)")
-    plt.show()
+    print(f"✅ Weighted graph saved as {', '.join(paths)}")
 
-    # === 8️⃣ 保存图结构 ===
-    g.write_gml("results/character_relationships_weighted.gml")
-    print("✅ Weighted graph saved as results/character_relationships_weighted.gml")
+    # === 9️⃣ 角色网络指标 (按图哈希缓存) ===
+    write_character_metrics(g)
 
 
 # ======================================================
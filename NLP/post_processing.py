@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import igraph as ig
 import os
 
+from relation_aggregate import canonical_relation
+
 
 def load_names():
     """Load names from a CSV file and return a dictionary mapping IDs to names."""
@@ -29,30 +31,8 @@ def process_data():
     # Drop rows where entity1_id and entity2_id are the same
     df = df[df["Entity1_ID"] != df["Entity2_ID"]]
 
-    # Standardize relationship types (combine singular and plural forms)
-    def standardize_relationship(relationship):
-        """Standardize relationship types to singular forms"""
-        relationship = relationship.lower().strip()
-
-        # Define mapping of plural to singular forms
-        standardization_map = {
-            "friends": "friend",
-            "daughters": "daughter",
-            "sons": "son",
-            "brothers": "brother",
-            "sisters": "sister",
-            "parents": "parent",
-            "couples": "couple",
-            "wives": "wife",
-            "husbands": "husband",
-            "fathers": "father",
-            "mothers": "mother",
-        }
-
-        return standardization_map.get(relationship, relationship)
-
     # Apply standardization
-    df["Relationship"] = df["Relationship"].apply(standardize_relationship)
+    df["Relationship"] = df["Relationship"].apply(canonical_relation)
 
     # Create a sorted tuple of the two IDs to identify bidirectional pairs
     df["sorted_pair"] = df.apply(
@@ -0,0 +1,83 @@
+import re
+
+import numpy as np
+
+
+# titles are not evidence of a character on their own ("Mr" is in half the
+# book); an alias made only of a title (e.g. "Colonel") still counts
+TITLE_WORDS = {"mr", "mrs", "miss", "ms", "lady", "sir", "lord", "colonel",
+               "capt", "captain", "rev", "general", "de"}
+
+def _alternation(words):
+    # longest first, so the regex engine prefers "fiancée" over "fiancé"
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+class SentencePrefilter:
+    """
+    Raw-text test run before spaCy: a sentence is parsed only if it contains
+    a relation trigger, and, when alias words are given, at least one
+    character alias word. Both sides are a single compiled regex each.
+
+    Triggers are every spelling of the main1/main2 trigger words, matched
+    as word prefixes (sister, sisters, sisterly), so regular plurals and
+    the irregular forms listed in the lexicon are caught. Both extractors
+    need a trigger, so the trigger test alone never drops a relation.
+
+    The alias test (from_kb) is a heuristic and is off unless asked for:
+    alias words are the whole words of every KB name and alias, and
+    coreference-annotated mentions count as aliases. It misses NER PERSONs
+    that are not in the KB and names that only link through the substring
+    fallback of main3's make_kb_matcher (the span "Mrs. Long" links through
+    "Mrs Longbourn"), so it can skip sentences the extractors would use.
+    """
+
+    def __init__(self, trigger_words, alias_words=None, require_trigger=True):
+        triggers = {w.lower() for w in trigger_words}
+        self.trigger_re = re.compile(r"\b(?:%s)" % _alternation(triggers), re.IGNORECASE)
+        self.alias_re = None
+        if alias_words is not None:
+            self.alias_re = re.compile(r"\b(?:%s)\b" % _alternation(alias_words), re.IGNORECASE)
+        self.require_trigger = require_trigger
+        self.kept = self.skipped = 0
+
+    @classmethod
+    def from_kb(cls, kb, trigger_words, require_trigger=True):
+        """kb is the {qid: {"name", "aliases"}} dict of load_knowledge_base."""
+        words = set()
+        for entry in kb.values():
+            for alias in [entry["name"]] + list(entry.get("aliases", [])):
+                parts = re.findall(r"[^\W\d_]+", alias.lower())
+                names = [p for p in parts if p not in TITLE_WORDS]
+                words.update(names or parts)
+        return cls(trigger_words, words, require_trigger)
+
+    def keep(self, text, has_mention=False):
+        """has_mention: the text holds a coreference-annotated character mention."""
+        if self.require_trigger and not self.trigger_re.search(text):
+            return False
+        if self.alias_re is None:
+            return True
+        return has_mention or self.alias_re.search(text) is not None
+
+    def select(self, chunks, annotations=None):
+        """
+        Indices of the (start_char, text) chunks worth parsing. A chunk that
+        holds a coreference-annotated mention passes the alias test.
+        """
+        if self.alias_re is None:
+            annotations = None
+        keep = np.fromiter(
+            (self.keep(text, annotations is not None
+                       and len(annotations.mentions_between(start, start + len(text))) > 0)
+             for start, text in chunks),
+            dtype=bool, count=len(chunks))
+        indices = np.flatnonzero(keep)
+        self.kept += len(indices)
+        self.skipped += len(chunks) - len(indices)
+        return indices
+
+    def report(self):
+        total = self.kept + self.skipped
+        share = 100.0 * self.skipped / total if total else 0.0
+        return f"Prefilter: parsing {self.kept} / {total} sentences, skipped {self.skipped} ({share:.1f}%)"
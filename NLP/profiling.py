@@ -0,0 +1,206 @@
+import cProfile, io, json, os, pstats, threading, time
+from contextlib import contextmanager
+from functools import wraps
+
+
+# name -> {"kind", "calls", "seconds", "docs", "tokens"}
+_TIMINGS = {}
+# pipeline threads record concurrently (see pipeline.py)
+_LOCK = threading.Lock()
+_RUN_START = time.perf_counter()
+
+
+# ========== 1. Recording ==========
+def _record(name, kind, seconds, docs=0, tokens=0, calls=1):
+    with _LOCK:
+        entry = _TIMINGS.setdefault(
+            name, {"kind": kind, "calls": 0, "seconds": 0.0, "docs": 0, "tokens": 0}
+        )
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+        entry["docs"] += docs
+        entry["tokens"] += tokens
+
+
+def add_timing(name, seconds, calls=1, kind="stage"):
+    """Record time measured elsewhere (e.g. busy time of a pipeline thread)."""
+    _record(name, kind, seconds, calls=calls)
+
+
+def reset_timings():
+    global _RUN_START
+    with _LOCK:
+        _TIMINGS.clear()
+        _RUN_START = time.perf_counter()
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Time a Python stage of the run (reading, segmentation, KB matching, CSV I/O ...).
+    Stages may be nested; each one is reported on its own line.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, "stage", time.perf_counter() - start)
+
+
+def timed_component(name):
+    """
+    Decorator for doc -> doc helpers (title merger, relation matcher) so they
+    show up in the report next to the spaCy components.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(doc, *args, **kwargs):
+            start = time.perf_counter()
+            result = func(doc, *args, **kwargs)
+            _record(name, "component", time.perf_counter() - start, 1, len(doc))
+            return result
+        return wrapper
+    return decorator
+
+
+# ========== 2. spaCy pipeline components ==========
+class _TimedPipe:
+    """Proxy around a pipeline component that times __call__ and pipe()."""
+
+    def __init__(self, name, proc):
+        self._name = name
+        self._proc = proc
+
+    def __call__(self, doc):
+        start = time.perf_counter()
+        doc = self._proc(doc)
+        _record(self._name, "component", time.perf_counter() - start, 1, len(doc))
+        return doc
+
+    def pipe(self, docs, **kwargs):
+        if hasattr(self._proc, "pipe"):
+            stream = self._proc.pipe(docs, **kwargs)
+        else:
+            stream = (self._proc(doc) for doc in docs)
+        # The stream is lazy, so only the time spent inside next() is counted.
+        while True:
+            start = time.perf_counter()
+            try:
+                doc = next(stream)
+            except StopIteration:
+                return
+            _record(self._name, "component", time.perf_counter() - start, 1, len(doc))
+            yield doc
+
+    def __getattr__(self, attr):
+        # guard so copy/pickle (which probe attributes before __init__ ran)
+        # don't recurse through self._proc
+        if attr in ("_name", "_proc") or attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self._proc, attr)
+
+
+def instrument_pipeline(nlp, n_process=1):
+    """
+    Wrap every component of a loaded pipeline (tok2vec, tagger, parser, ner ...)
+    so calls, time and docs/tokens are recorded for nlp(text) and nlp.pipe().
+    spaCy has no public hook for this: v3 keeps the (name, component) pairs
+    in nlp._components and runs them from there, so the proxies are swapped
+    in place, and other versions are left alone. With n_process > 1 the
+    components run in worker processes whose timings never reach this one,
+    so nothing is wrapped and only the stage totals are reported.
+    """
+    import spacy
+
+    if n_process > 1:
+        print(f"⚠️ per-component timings are not collected with {n_process} worker processes")
+        return nlp
+    components = getattr(nlp, "_components", None)
+    if not spacy.__version__.startswith("3.") or not isinstance(components, list):
+        print(f"⚠️ per-component timings are not supported on spaCy {spacy.__version__}")
+        return nlp
+    nlp._components = [
+        (name, proc if isinstance(proc, _TimedPipe) else _TimedPipe(name, proc))
+        for name, proc in components
+    ]
+    return nlp
+
+
+# ========== 3. Report ==========
+def timing_report():
+    with _LOCK:
+        wall = time.perf_counter() - _RUN_START
+        timings = {name: dict(entry) for name, entry in _TIMINGS.items()}
+    rows = []
+    for name, entry in timings.items():
+        seconds = entry["seconds"]
+        rows.append({
+            "name": name,
+            "kind": entry["kind"],
+            "calls": entry["calls"],
+            "seconds": round(seconds, 6),
+            "share_of_wall": round(seconds / wall, 4) if wall else 0.0,
+            "docs": entry["docs"],
+            "tokens": entry["tokens"],
+            "tokens_per_sec": round(entry["tokens"] / seconds, 1) if seconds else 0.0,
+        })
+    rows.sort(key=lambda r: r["seconds"], reverse=True)
+    return {"wall_seconds": round(wall, 6), "timings": rows}
+
+
+def write_timing_report(path="results/timing_report.json"):
+    report = timing_report()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'name':<24}{'kind':<11}{'calls':>8}{'seconds':>11}{'share':>8}")
+    for row in report["timings"]:
+        print(f"{row['name']:<24}{row['kind']:<11}{row['calls']:>8}"
+              f"{row['seconds']:>11.3f}{row['share_of_wall']:>8.1%}")
+    print(f" Saved timing report → {path}")
+    return report
+
+
+# ========== 4. Profiler capture ==========
+def run_profiled(func, mode=None, out_dir="results"):
+    """
+    Run func() under cProfile or pyinstrument. mode=None just calls func().
+    cProfile writes <out_dir>/profile.prof plus a text summary;
+    pyinstrument (optional dependency) writes <out_dir>/profile.html.
+    """
+    if not mode:
+        return func()
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func)
+        prof_path = os.path.join(out_dir, "profile.prof")
+        profiler.dump_stats(prof_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(out_dir, "profile.txt"), "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        print(f" Saved cProfile capture → {prof_path}")
+        return result
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("pyinstrument is not installed: pip install pyinstrument")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            result = func()
+        finally:
+            profiler.stop()
+        html_path = os.path.join(out_dir, "profile.html")
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+        print(f" Saved pyinstrument capture → {html_path}")
+        return result
+
+    raise ValueError(f"Unknown profile mode: {mode}")
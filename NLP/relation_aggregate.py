@@ -0,0 +1,103 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from relation_offsets import OFFSET_COLUMNS
+from relation_lexicon import relation_lexicon
+
+
+AGGREGATE_COLUMNS = ["Entity1_ID", "Entity1", "Relationship", "Entity2_ID", "Entity2",
+                     "Mode", "Source", "Count"]
+
+
+def canonical_relation(word):
+    return relation_lexicon().canonical_form(word)
+
+
+class RelationAggregator:
+    """
+    Counts relations as they are linked, keyed by
+    ((Entity1_ID, Entity1), Relationship, (Entity2_ID, Entity2), Mode, Source)
+    with canonical relation words and sorted pairs for symmetric relations.
+    With keep_evidence=True the raw rows and their offsets are kept as well.
+    Rows come one at a time (add) or as a linked frame (add_frame).
+    """
+
+    def __init__(self, keep_evidence=False):
+        self.counts = Counter()
+        self.keep_evidence = keep_evidence
+        self.evidence_rows = []
+        self.evidence_offsets = []
+        self.evidence_frames = []
+        self.evidence_offset_arrays = []
+
+    def _count(self, e1, rel, e2, mode, source, n=1):
+        rel = canonical_relation(rel)
+        if rel in relation_lexicon().symmetric and e2 < e1:
+            e1, e2 = e2, e1
+        self.counts[(e1, rel, e2, mode, source)] += n
+
+    def add(self, row, offsets=None):
+        self._count((row["Entity1_ID"], row["Entity1"]), row["Relationship"],
+                    (row["Entity2_ID"], row["Entity2"]), row["Mode"], row["Source"])
+        if self.keep_evidence:
+            self.evidence_rows.append(row)
+            self.evidence_offsets.append(offsets)
+
+    def add_frame(self, frame, offsets):
+        """
+        Linked rows as a DataFrame (the consolidated_relationships.csv
+        columns) plus their offsets array. Rows are grouped first, so the
+        Python-level work is once per distinct relation, not per mention.
+        """
+        keys = ["Entity1_ID", "Entity1", "Relationship", "Entity2_ID", "Entity2", "Mode", "Source"]
+        sizes = frame.groupby(keys, observed=True, sort=False).size()
+        for (id1, name1, rel, id2, name2, mode, source), n in sizes.items():
+            self._count((id1, name1), rel, (id2, name2), mode, source, int(n))
+        if self.keep_evidence:
+            self.evidence_frames.append(frame)
+            self.evidence_offset_arrays.append(np.asarray(offsets, dtype=np.int32))
+
+    def evidence_frame(self, columns=None):
+        """Every kept raw row as one DataFrame (add_frame rows first, then add rows)."""
+        frames = list(self.evidence_frames)
+        if self.evidence_rows:
+            frames.append(pd.DataFrame(self.evidence_rows))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        return df[columns] if columns is not None else df
+
+    def evidence_offsets_array(self):
+        """Offsets of evidence_frame(), row for row."""
+        arrays = list(self.evidence_offset_arrays)
+        if self.evidence_offsets:
+            arrays.append(np.asarray(self.evidence_offsets, dtype=np.int32))
+        if not arrays:
+            return np.empty((0, len(OFFSET_COLUMNS)), dtype=np.int32)
+        return np.concatenate([a.reshape(-1, len(OFFSET_COLUMNS)) for a in arrays])
+
+    def __len__(self):
+        return len(self.counts)
+
+    def to_frame(self):
+        records = [
+            (e1[0], e1[1], rel, e2[0], e2[1], mode, source, count)
+            for (e1, rel, e2, mode, source), count in self.counts.items()
+        ]
+        df = pd.DataFrame(records, columns=AGGREGATE_COLUMNS)
+        return df.sort_values("Count", ascending=False, kind="stable").reset_index(drop=True)
+
+    def write(self, path="relationship_aggregate.csv"):
+        df = self.to_frame()
+        df.to_csv(path, index=False, encoding="utf-8")
+        print(f" Saved {len(df)} aggregated relations ({int(df['Count'].sum())} mentions) → {path}")
+        return df
+
+    def write_evidence(self, csv_path, offsets_path, columns):
+        """Raw per-mention rows (as consolidated_relationships.csv) plus their offsets."""
+        df = self.evidence_frame(columns)
+        df.to_csv(csv_path, index=False, encoding="utf-8")
+        np.save(offsets_path, self.evidence_offsets_array())
+        print(f" Saved {len(df)} raw relations → {csv_path} (+ {offsets_path})")
@@ -0,0 +1,118 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+
+
+LEXICON_PATH = "relation_lexicon.json"
+
+
+class RelationLexicon:
+    """
+    The relation vocabulary of relation_lexicon.json, compiled once.
+    relations are the canonical words, canonical maps every spelling
+    (plurals, variants) to its canonical word, forms are all spellings and
+    symmetric the relations whose pair is stored sorted. triggers holds the
+    subset of canonical words each extractor fires on (see words()). A
+    trigger set given as {"exact": [spellings]} matches only those
+    spellings instead of every form of its words (see spellings()).
+    """
+
+    def __init__(self, entries, triggers=None):
+        self.relations = frozenset(entries)
+        self.canonical = {}
+        for word, entry in entries.items():
+            self.canonical[word] = word
+            for form in entry.get("forms", []):
+                self.canonical[form] = word
+        self.forms = frozenset(self.canonical)
+        self.symmetric = frozenset(w for w, entry in entries.items() if entry.get("symmetric"))
+        self.triggers = {}
+        self.exact = {}
+        for name, words in (triggers or {}).items():
+            known = self.relations
+            if isinstance(words, dict):
+                words = self.exact[name] = frozenset(words["exact"])
+                known = self.forms
+            unknown = set(words) - known
+            if unknown:
+                raise ValueError(f"trigger set {name!r} names words missing from relations: {sorted(unknown)}")
+            self.triggers[name] = frozenset(self.canonical[w] for w in words)
+
+    def words(self, trigger=None):
+        """Canonical words of a trigger set, or all relations when trigger is None."""
+        return self.relations if trigger is None else self.triggers[trigger]
+
+    def spellings(self, trigger=None):
+        """{spelling: canonical word} for the words of a trigger set (only its listed spellings if exact)."""
+        if trigger in self.exact:
+            return {form: self.canonical[form] for form in self.exact[trigger]}
+        words = self.words(trigger)
+        return {form: word for form, word in self.canonical.items() if word in words}
+
+    def canonical_form(self, word):
+        """Canonical relation word; words outside the lexicon come back lower-cased."""
+        word = word.lower().strip()
+        return self.canonical.get(word, word)
+
+    def is_relation(self, word, trigger=None):
+        return self.canonical.get(word.lower().strip()) in self.words(trigger)
+
+
+@lru_cache(maxsize=None)
+def relation_lexicon(path=LEXICON_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return RelationLexicon(data["relations"], data.get("triggers"))
+
+
+@lru_cache(maxsize=None)
+def relation_hashes(vocab, trigger=None, path=LEXICON_PATH):
+    """
+    {StringStore hash: canonical word} for every spelling of a trigger set,
+    so a token is tested with integer lookups of token.norm / token.lemma
+    and no string is built per token. Lemmas map inflections ("daughters")
+    for free.
+    """
+    spellings = relation_lexicon(path).spellings(trigger)
+    return {vocab.strings.add(form): word for form, word in spellings.items()}
+
+
+@lru_cache(maxsize=None)
+def relation_hash_array(vocab, trigger=None, path=LEXICON_PATH):
+    """The relation_hashes keys as a uint64 array, for np.isin over Doc.to_array columns."""
+    return np.fromiter(relation_hashes(vocab, trigger, path), dtype=np.uint64)
+
+
+@lru_cache(maxsize=None)
+def relation_patterns(nlp, trigger=None, path=LEXICON_PATH, min_tokens=1):
+    """
+    PhraseMatcher pattern Docs for every spelling of a trigger set,
+    tokenized by nlp, so multi-token forms such as "in-law" match too.
+    min_tokens=2 keeps only those multi-token forms.
+    """
+    docs = nlp.tokenizer.pipe(sorted(relation_lexicon(path).spellings(trigger)))
+    return [doc for doc in docs if len(doc) >= min_tokens]
+
+
+@lru_cache(maxsize=None)
+def relation_matcher(nlp, trigger=None, label="RELATIONSHIP", path=LEXICON_PATH, min_tokens=1):
+    """
+    Case-insensitive PhraseMatcher over a trigger set, built once per
+    pipeline. Filter its matches with is_compound_tail.
+    """
+    # imported here so post-processing can use the lexicon without spaCy
+    from spacy.matcher import PhraseMatcher
+
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    matcher.add(label, relation_patterns(nlp, trigger, path, min_tokens))
+    return matcher
+
+
+def is_compound_tail(doc, start):
+    """
+    True when a match starting at token `start` is the tail of a hyphenated
+    compound, e.g. "in-law" inside "brother-in-law", whose head word is
+    matched on its own.
+    """
+    return start > 1 and doc[start - 1].text == "-" and not doc[start - 2].whitespace_
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+# Books a relation can point into; doc_id is the position in this list.
+# main3 now extracts everything from clean_book.txt (coreference is an
+# annotation layer); doc_id 1 only appears in offsets from older runs.
+BOOKS = ["clean_book.txt", "resolved_book.txt"]
+
+# One int32 row per relation, aligned with the rows of consolidated_relationships.csv.
+# segment_idx is the sentence index in sentence mode (chunk index in 100-token mode);
+# all *_start / *_end values are character offsets into BOOKS[doc_id].
+OFFSET_COLUMNS = [
+    "doc_id", "segment_idx",
+    "rel_start", "rel_end",
+    "e1_start", "e1_end",
+    "e2_start", "e2_end",
+]
+MISSING = (-1,) * len(OFFSET_COLUMNS)
+
+
+# ========== 1. Build ==========
+def relation_offsets(doc_id, segment_idx, base, rel, e1, e2):
+    """
+    Offsets of a relation found in a chunk that starts at character `base`
+    of the book. rel / e1 / e2 are Spans (or Tokens) of the chunk's Doc.
+    """
+    def bounds(span):
+        start = span.start_char if hasattr(span, "start_char") else span.idx
+        end = span.end_char if hasattr(span, "end_char") else span.idx + len(span)
+        return base + start, base + end
+
+    return (doc_id, segment_idx) + bounds(rel) + bounds(e1) + bounds(e2)
+
+
+def offsets_array(rows):
+    if not rows:
+        return np.empty((0, len(OFFSET_COLUMNS)), dtype=np.int32)
+    return np.asarray(rows, dtype=np.int32)
+
+
+def save_offsets(path, offsets):
+    np.save(path, offsets)
+
+
+def load_offsets(path):
+    """Memory-mapped load; rows are read lazily from disk."""
+    return np.load(path, mmap_mode="r")
@@ -0,0 +1,95 @@
+import sys
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from relation_offsets import OFFSET_COLUMNS, MISSING
+
+
+STRING_COLUMNS = ("rel", "e1", "e2", "mode", "source")
+
+
+def _text(value):
+    return value.text if hasattr(value, "text") else str(value)
+
+
+class RelationRecord:
+    """One extracted relation, text only (no Span / Doc references)."""
+
+    __slots__ = ("rel", "e1", "e2", "mode", "source", "offsets")
+
+    def __init__(self, rel, e1, e2, mode, source, offsets=MISSING):
+        self.rel = rel
+        self.e1 = e1
+        self.e2 = e2
+        self.mode = mode
+        self.source = source
+        self.offsets = offsets
+
+    def __repr__(self):
+        return f"RelationRecord({self.rel!r}, {self.e1!r}, {self.e2!r}, {self.mode!r}, {self.source!r})"
+
+
+class RelationStore:
+    """
+    Columnar store of extracted relations. Every string (relation word,
+    entity text, mode, source) is interned once and the rows keep only int32
+    ids plus the int32 offsets row, in array.array buffers. Spans are turned
+    into text on append, so each Doc can be freed right after extraction.
+    columns() / offsets() / to_frame() wrap the buffers without copying them.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self._cols = {name: array("i") for name in STRING_COLUMNS}
+        self._offsets = array("i")
+
+    def intern(self, value):
+        value = sys.intern(value)
+        sid = self._string_ids.get(value)
+        if sid is None:
+            sid = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+    def append(self, rel, e1, e2, mode, source, offsets=MISSING):
+        """rel / e1 / e2 may be Spans or strings."""
+        for name, value in zip(STRING_COLUMNS, (rel, e1, e2, mode, source)):
+            self._cols[name].append(self.intern(_text(value)))
+        self._offsets.extend(offsets)
+
+    def __len__(self):
+        return len(self._cols["rel"])
+
+    def __iter__(self):
+        strings = self.strings
+        width = len(OFFSET_COLUMNS)
+        cols = [self._cols[name] for name in STRING_COLUMNS]
+        for i, ids in enumerate(zip(*cols)):
+            yield RelationRecord(*(strings[s] for s in ids),
+                                 offsets=tuple(self._offsets[i * width:(i + 1) * width]))
+
+    def columns(self):
+        """Interned id columns as int32 NumPy views of the buffers."""
+        return {name: np.frombuffer(col, dtype=np.intc) for name, col in self._cols.items()}
+
+    def offsets(self):
+        return np.frombuffer(self._offsets, dtype=np.intc).reshape(-1, len(OFFSET_COLUMNS))
+
+    def to_frame(self):
+        """
+        DataFrame of categorical columns built straight from the id buffers:
+        the codes are the interned ids and the categories the string table,
+        so no per-row string is created.
+        """
+        categories = pd.Index(self.strings)
+        data = {
+            name: pd.Categorical.from_codes(codes, categories=categories)
+            for name, codes in self.columns().items()
+        }
+        offsets = self.offsets()
+        for j, name in enumerate(OFFSET_COLUMNS):
+            data[name] = offsets[:, j]
+        return pd.DataFrame(data, copy=False)
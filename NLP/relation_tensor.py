@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+
+class RelationTensor:
+    """
+    Sparse (entity x entity x relation-type) count tensor in COO form.
+    Entries are kept sorted by (e1, e2, rel) with duplicates summed, so
+    every pair is a contiguous run; a second ordering by relation gives
+    CSR-style O(1) access to one relation type. Entity and relation axes
+    are the integer ids of a vocabulary.Vocabulary, and the string tables
+    travel with the tensor so it can be saved and decoded on its own.
+    """
+
+    def __init__(self, e1, e2, rel, counts, qids, relations):
+        e1, e2, rel = (np.asarray(a, dtype=np.int32) for a in (e1, e2, rel))
+        counts = np.asarray(counts, dtype=np.int64)
+
+        order = np.lexsort((rel, e2, e1))
+        e1, e2, rel, counts = e1[order], e2[order], rel[order], counts[order]
+        # sum duplicate (e1, e2, rel) coordinates
+        new = np.ones(len(e1), dtype=bool)
+        new[1:] = (e1[1:] != e1[:-1]) | (e2[1:] != e2[:-1]) | (rel[1:] != rel[:-1])
+        starts = np.flatnonzero(new)
+        self.e1, self.e2, self.rel = e1[starts], e2[starts], rel[starts]
+        self.counts = np.add.reduceat(counts, starts) if len(starts) else counts[:0]
+
+        self.qids = list(qids)
+        self.relations = list(relations)
+        self.shape = (len(self.qids), len(self.qids), len(self.relations))
+
+        # pair runs
+        pair_new = np.ones(len(self.e1), dtype=bool)
+        pair_new[1:] = (self.e1[1:] != self.e1[:-1]) | (self.e2[1:] != self.e2[:-1])
+        self._pair_starts = np.flatnonzero(pair_new)
+
+        # relation-major index for slicing by relation type
+        self._by_rel = np.argsort(self.rel, kind="stable")
+        self._rel_ptr = np.searchsorted(self.rel[self._by_rel], np.arange(self.shape[2] + 1))
+
+    @property
+    def nnz(self):
+        return len(self.counts)
+
+    # ---------- queries ----------
+    def relation_slice(self, rel_id):
+        """(e1, e2, counts) of all pairs with relation type rel_id."""
+        idx = self._by_rel[self._rel_ptr[rel_id]:self._rel_ptr[rel_id + 1]]
+        return self.e1[idx], self.e2[idx], self.counts[idx]
+
+    def pairs(self):
+        """(e1, e2) of every pair with at least one relation."""
+        return self.e1[self._pair_starts], self.e2[self._pair_starts]
+
+    def pair_totals(self):
+        return np.add.reduceat(self.counts, self._pair_starts) if self.nnz else self.counts[:0]
+
+    def pair_unique_relations(self):
+        return np.diff(np.append(self._pair_starts, self.nnz))
+
+    def dominant_relation(self):
+        """
+        Per pair: (e1, e2, relation id, count) of the most frequent relation.
+        Ties go to the lowest relation id, as DataFrame.idxmax did on the
+        alphabetically ordered pivot columns.
+        """
+        pair_of = np.repeat(np.arange(len(self._pair_starts)),
+                            np.diff(np.append(self._pair_starts, self.nnz)))
+        order = np.lexsort((self.rel, -self.counts, pair_of))
+        first = order[np.searchsorted(pair_of[order], np.arange(len(self._pair_starts)))]
+        return self.e1[first], self.e2[first], self.rel[first], self.counts[first]
+
+    def entity_marginals(self):
+        """Total relation mentions per entity (either side of the pair)."""
+        n = self.shape[0]
+        return (np.bincount(self.e1, weights=self.counts, minlength=n)
+                + np.bincount(self.e2, weights=self.counts, minlength=n)).astype(np.int64)
+
+    def relation_marginals(self):
+        return np.bincount(self.rel, weights=self.counts,
+                           minlength=self.shape[2]).astype(np.int64)
+
+    # ---------- export ----------
+    def to_pivot(self, format_pair):
+        """
+        Dense pair x relation table (the relationship_pivot_summary.csv
+        layout). Only relation types that occur become columns.
+        """
+        used = np.flatnonzero(self.relation_marginals())
+        col_of = np.full(self.shape[2], -1)
+        col_of[used] = np.arange(len(used))
+        pair_row = np.repeat(np.arange(len(self._pair_starts)),
+                             np.diff(np.append(self._pair_starts, self.nnz)))
+        dense = np.zeros((len(self._pair_starts), len(used)), dtype=np.int64)
+        dense[pair_row, col_of[self.rel]] = self.counts
+
+        e1, e2 = self.pairs()
+        pivot = pd.DataFrame(dense, columns=[self.relations[r] for r in used])
+        qids = np.asarray(self.qids, dtype=object)
+        pivot.insert(0, "sorted_pair", format_pair(qids[e1], qids[e2]))
+        return pivot
+
+    def save(self, path):
+        np.savez_compressed(path, e1=self.e1, e2=self.e2, rel=self.rel, counts=self.counts,
+                            qids=np.asarray(self.qids, dtype=str),
+                            relations=np.asarray(self.relations, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["e1"], data["e2"], data["rel"], data["counts"],
+                       data["qids"].tolist(), data["relations"].tolist())
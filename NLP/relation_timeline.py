@@ -0,0 +1,161 @@
+import argparse, os
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+import numpy as np
+import pandas as pd
+
+from vocabulary import Vocabulary
+
+
+class RelationTimeline:
+    """
+    Character-pair weights over chapters. Per-chapter counts are kept as a
+    sparse (chapter, pair, count) COO list, and a prefix-sum matrix
+    cumulative[c, p] = mentions of pair p in chapters < c is built from it.
+    The weight of any pair over any chapter range is then one subtraction,
+    and the same subtraction on whole rows answers it for all pairs at once.
+    Chapter c is the book's CHAPTER c + 1; the front matter is not a chapter.
+    """
+
+    def __init__(self, chapter, e1, e2, counts, qids, n_chapters=None):
+        chapter = np.asarray(chapter, dtype=np.int64)
+        e1, e2 = np.asarray(e1, dtype=np.int64), np.asarray(e2, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        self.qids = list(qids)
+        self._qid_index = {q: i for i, q in enumerate(self.qids)}
+        self.n_chapters = int(n_chapters if n_chapters is not None
+                              else (chapter.max() + 1 if len(chapter) else 0))
+
+        # undirected pair id: position of (min, max) among the distinct pairs
+        n = max(len(self.qids), 1)
+        keys, pair = np.unique(np.minimum(e1, e2) * n + np.maximum(e1, e2), return_inverse=True)
+        self.pair_e1, self.pair_e2 = keys // n, keys % n
+        self._pair_of = {(int(a), int(b)): i for i, (a, b) in enumerate(zip(self.pair_e1, self.pair_e2))}
+
+        # sparse per-chapter counts, duplicates summed
+        flat, inverse = np.unique(chapter * len(keys) + pair, return_inverse=True)
+        self.chapter = flat // max(len(keys), 1)
+        self.pair = flat % max(len(keys), 1)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(flat)).astype(np.int64)
+
+        self.cumulative = np.zeros((self.n_chapters + 1, len(keys)), dtype=np.int64)
+        np.add.at(self.cumulative, (self.chapter + 1, self.pair), self.counts)
+        np.cumsum(self.cumulative, axis=0, out=self.cumulative)
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_e1)
+
+    # ---------- queries ----------
+    def pair_index(self, q1, q2):
+        """Pair id of two QIDs (either order), or -1 if they never co-occur."""
+        a, b = self._qid_index.get(q1, -1), self._qid_index.get(q2, -1)
+        return self._pair_of.get((min(a, b), max(a, b)), -1)
+
+    def _clamp(self, start, stop):
+        stop = self.n_chapters if stop is None else stop
+        start = min(max(start, 0), self.n_chapters)
+        return start, min(max(stop, start), self.n_chapters)
+
+    def between(self, start=0, stop=None):
+        """Weights of every pair over chapters [start, stop)."""
+        start, stop = self._clamp(start, stop)
+        return self.cumulative[stop] - self.cumulative[start]
+
+    def weight(self, q1, q2, start=0, stop=None):
+        """Weight of one pair over chapters [start, stop), O(1)."""
+        p = self.pair_index(q1, q2)
+        if p < 0:
+            return 0
+        start, stop = self._clamp(start, stop)
+        return int(self.cumulative[stop, p] - self.cumulative[start, p])
+
+    def per_chapter(self):
+        """Dense (chapter x pair) per-chapter weights."""
+        return np.diff(self.cumulative, axis=0)
+
+    def pair_labels(self, name_dict=None):
+        name_dict = name_dict or {}
+        return [f"{name_dict.get(self.qids[a], self.qids[a])} – {name_dict.get(self.qids[b], self.qids[b])}"
+                for a, b in zip(self.pair_e1, self.pair_e2)]
+
+    # ---------- build / persist ----------
+    @classmethod
+    def from_frame(cls, df, name_dict, chapter_col="Segment", n_chapters=None, first_chapter=1):
+        """
+        Relation rows with Entity1_ID / Entity2_ID and a chapter index column
+        (the Segment column of the by_chapter granularity table).
+        first_chapter is the segment of CHAPTER I: segment 0 of the book
+        store is the text before the first heading, so it is dropped and the
+        segments are renumbered from CHAPTER I.
+        """
+        df = df.dropna(subset=["Entity1_ID", "Entity2_ID"])
+        vocab = Vocabulary.from_kb(name_dict)
+        e1 = vocab.qids.encode_array(df["Entity1_ID"])
+        e2 = vocab.qids.encode_array(df["Entity2_ID"])
+        chapter = df[chapter_col].to_numpy() - first_chapter
+        counts = df["Count"].to_numpy() if "Count" in df.columns else np.ones(len(df), dtype=np.int64)
+        keep = (e1 >= 0) & (e2 >= 0) & (e1 != e2) & (chapter >= 0)
+        return cls(chapter[keep], e1[keep], e2[keep], counts[keep], vocab.qids.values, n_chapters)
+
+    def save(self, path):
+        np.savez_compressed(path, chapter=self.chapter, e1=self.pair_e1[self.pair],
+                            e2=self.pair_e2[self.pair], counts=self.counts,
+                            qids=np.asarray(self.qids, dtype=str),
+                            n_chapters=np.int64(self.n_chapters))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["chapter"], data["e1"], data["e2"], data["counts"],
+                       data["qids"].tolist(), int(data["n_chapters"]))
+
+    # ---------- plot ----------
+    def plot_evolution(self, out_path="results/relationship_evolution.png", name_dict=None,
+                       top=10, cumulative=True):
+        """
+        Weight curves of every pair in one LineCollection, built from the
+        prefix-sum matrix in a single pass; the `top` strongest pairs are
+        highlighted and labelled.
+        """
+        values = self.cumulative[1:] if cumulative else self.per_chapter()
+        x = np.arange(1, self.n_chapters + 1)  # chapter numbers of the book
+        fig, ax = plt.subplots(figsize=(12, 6))
+        if self.n_pairs:
+            segments = np.stack([np.broadcast_to(x[:, None], values.shape), values], axis=-1)
+            ax.add_collection(LineCollection(segments.transpose(1, 0, 2), colors="lightgray", linewidths=0.6))
+            labels = self.pair_labels(name_dict)
+            for p in np.argsort(-self.cumulative[-1])[:top]:
+                ax.plot(x, values[:, p], linewidth=1.6, label=labels[p])
+            ax.legend(fontsize=7, loc="upper left")
+        ax.set_xlim(1, max(self.n_chapters, 2))
+        ax.set_ylim(0, max(values.max() if values.size else 1, 1) * 1.05)
+        ax.set_xlabel("Chapter")
+        ax.set_ylabel("Cumulative mentions" if cumulative else "Mentions per chapter")
+        ax.set_title("Relationship evolution across chapters")
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        fig.savefig(out_path, dpi=150, bbox_inches="tight")
+        plt.close(fig)
+        print(f"✅ Rendered {out_path}")
+        return out_path
+
+
+if __name__ == "__main__":
+    from post_process_updated import load_names
+
+    parser = argparse.ArgumentParser(description="Chapter-by-chapter evolution of character relationships.")
+    parser.add_argument("--input", default="results/relationship_timeline.npz",
+                        help="timeline .npz, or a by_chapter table with a Segment column")
+    parser.add_argument("--per-chapter", action="store_true", help="plot per-chapter instead of cumulative weights")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    names = load_names()
+    if args.input.endswith(".npz"):
+        timeline = RelationTimeline.load(args.input)
+    else:
+        timeline = RelationTimeline.from_frame(pd.read_csv(args.input), names)
+    timeline.plot_evolution(name_dict=names, top=args.top, cumulative=not args.per_chapter)
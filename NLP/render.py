@@ -0,0 +1,182 @@
+import argparse, hashlib, os, time
+from multiprocessing import Pool
+
+import matplotlib
+matplotlib.use("Agg")  # headless: never needs a display
+import matplotlib.pyplot as plt
+import igraph as ig
+import numpy as np
+
+
+from profiling import add_timing
+
+
+LAYOUT_CACHE = "results/layout_cache"
+
+# graph size thresholds for the automatic layout choice
+SMALL_GRAPH = 300      # Fruchterman-Reingold, labels on everything
+LARGE_GRAPH = 5000     # above this DrL runs with its coarser preset
+EDGE_LABEL_LIMIT = 200
+
+
+# ========== 1. Layout cache ==========
+def graph_hash(g, weight="weight"):
+    """
+    Stable hash of a graph's structure: vertex names, edge list and edge
+    weights. Unchanged graphs get the same hash across runs.
+    """
+    h = hashlib.sha1()
+    names = g.vs["name"] if "name" in g.vs.attributes() else range(g.vcount())
+    h.update("\x1f".join(map(str, names)).encode("utf-8"))
+    h.update(np.asarray(g.get_edgelist(), dtype=np.int64).tobytes())
+    if weight in g.es.attributes():
+        h.update(np.asarray(g.es[weight], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def choose_layout(g):
+    """
+    (algorithm, kwargs) by graph size: Fruchterman-Reingold for book-sized
+    networks, DrL (the force-directed multilevel method behind OpenOrd,
+    implemented in igraph's C core) for corpus-sized ones.
+    """
+    n = g.vcount()
+    weights = "weight" if "weight" in g.es.attributes() else None
+    if n <= SMALL_GRAPH:
+        return "fruchterman_reingold", {}
+    if n <= LARGE_GRAPH:
+        return "drl", {"weights": weights}
+    return "drl", {"weights": weights, "options": "coarsen"}
+
+
+def compute_layout(g, algorithm="auto", cache_dir=LAYOUT_CACHE, **kwargs):
+    """
+    igraph layout, cached on disk as <cache_dir>/<graph hash>_<algorithm>.npy
+    so re-rendering an unchanged graph skips the layout computation.
+    algorithm="auto" picks one by graph size (choose_layout).
+    The layout time is printed and added to the timing report.
+    """
+    if algorithm == "auto":
+        algorithm, auto_kwargs = choose_layout(g)
+        kwargs = {**auto_kwargs, **kwargs}
+
+    path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{graph_hash(g)}_{algorithm}.npy")
+        if os.path.exists(path):
+            return ig.Layout(np.load(path).tolist())
+
+    start = time.perf_counter()
+    layout = g.layout(algorithm, **kwargs)
+    elapsed = time.perf_counter() - start
+    add_timing(f"layout_{algorithm}", elapsed)
+    print(f" Layout {algorithm} for {g.vcount()} nodes / {g.ecount()} edges: {elapsed:.2f}s")
+    if path:
+        np.save(path, np.asarray(layout.coords, dtype=np.float64))
+    return layout
+
+
+# ========== 2. Simplification for large graphs ==========
+def top_k_edges(g, k, weight="weight"):
+    """
+    Subgraph keeping, for every vertex, only its k heaviest edges (an edge
+    survives if it is in the top k of either endpoint). Vertices are kept.
+    """
+    m = g.ecount()
+    if m == 0 or k is None:
+        return g
+    edges = np.asarray(g.get_edgelist(), dtype=np.int64)
+    w = np.asarray(g.es[weight], dtype=np.float64) if weight in g.es.attributes() else np.ones(m)
+
+    ends = np.concatenate([edges[:, 0], edges[:, 1]])
+    eids = np.concatenate([np.arange(m), np.arange(m)])
+    weights = np.concatenate([w, w])
+    order = np.lexsort((-weights, ends))
+    sorted_ends = ends[order]
+    group_start = np.searchsorted(sorted_ends, sorted_ends, side="left")
+    rank = np.arange(len(order)) - group_start
+    keep = np.unique(eids[order][rank < k])
+    return g.subgraph_edges(keep.tolist(), delete_vertices=False)
+
+
+def label_plot_kwargs(g, max_vertex_labels=100, weight="weight"):
+    """
+    Label settings that stay readable as the graph grows: edge labels only
+    up to EDGE_LABEL_LIMIT edges, vertex labels only on the strongest nodes.
+    """
+    kwargs = {}
+    if "relationship" in g.es.attributes() and g.ecount() <= EDGE_LABEL_LIMIT:
+        kwargs["edge_label"] = g.es["relationship"]
+    if "label" in g.vs.attributes():
+        labels = list(g.vs["label"])
+        if g.vcount() > max_vertex_labels:
+            w = g.es[weight] if weight in g.es.attributes() else None
+            strength = np.asarray(g.strength(weights=w))
+            shown = set(np.argsort(-strength)[:max_vertex_labels].tolist())
+            labels = [lab if i in shown else "" for i, lab in enumerate(labels)]
+        kwargs["vertex_label"] = labels
+    return kwargs
+
+
+# ========== 3. Rendering ==========
+def render_graph(g, out_path, title=None, layout=None, figsize=(12, 12), dpi=150,
+                 **plot_kwargs):
+    """
+    Draw g with ig.plot onto an Agg figure and save it (PNG / SVG by the
+    extension of out_path). plot_kwargs go straight to ig.plot.
+    """
+    if layout is None:
+        layout = compute_layout(g)
+    fig, ax = plt.subplots(figsize=figsize)
+    ig.plot(g, target=ax, layout=layout, **plot_kwargs)
+    if title:
+        ax.set_title(title)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fig.savefig(out_path, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print(f"✅ Rendered {out_path}")
+    return out_path
+
+
+def _render_job(job):
+    g = job["graph"]
+    if isinstance(g, str):
+        g = ig.Graph.Read(g)
+    if job.get("top_k"):
+        g = top_k_edges(g, job["top_k"])
+    plot_kwargs = dict(job.get("plot_kwargs", {}))
+    if not plot_kwargs:
+        plot_kwargs = {"vertex_label_size": 8, "edge_label_size": 6,
+                       "vertex_color": "lightblue", "edge_color": "gray",
+                       "vertex_size": 40 if g.vcount() <= SMALL_GRAPH else 4,
+                       **label_plot_kwargs(g)}
+    return render_graph(g, job["out_path"], title=job.get("title"), **plot_kwargs)
+
+
+def render_many(jobs, processes=None):
+    """
+    Render many graphs in parallel worker processes. Each job is a dict with
+    "graph" (an igraph.Graph or a path igraph can read, e.g. .gml),
+    "out_path", and optional "title" / "plot_kwargs" / "top_k" (keep only
+    each vertex's k heaviest edges before drawing).
+    """
+    if processes == 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    with Pool(processes=processes) as pool:
+        return pool.map(_render_job, jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render graph files to images without a display.")
+    parser.add_argument("graphs", nargs="+", help="graph files (.gml, .graphml ...)")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="draw only each character's k strongest edges")
+    args = parser.parse_args()
+    render_many([
+        {"graph": path, "out_path": os.path.splitext(path)[0] + "." + args.format,
+         "title": os.path.basename(path), "top_k": args.top_k}
+        for path in args.graphs
+    ], processes=args.processes)
@@ -0,0 +1,164 @@
+import json, os, resource, sys, threading, time
+
+
+# ========== 1. Memory ==========
+def _rss_mb():
+    """Current resident set size in MB (falls back to peak RSS off Linux)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes on Linux
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+# ========== 2. Metrics files ==========
+# (metric name, snapshot key, Prometheus type, help text)
+PROM_METRICS = [
+    ("relex_units_done", "done", "gauge", "Units of work finished by the stage."),
+    ("relex_units_total", "total", "gauge", "Units of work the stage expects."),
+    ("relex_units_per_second", "units_per_sec", "gauge", "Average units per second since the stage started."),
+    ("relex_tokens_per_second", "tokens_per_sec", "gauge", "Average spaCy tokens per second since the stage started."),
+    ("relex_relations_total", "relations", "counter", "Relations produced by the stage."),
+    ("relex_kb_hit_ratio", "kb_hit_rate", "gauge", "Share of entity lookups that matched the knowledge base."),
+    ("relex_rss_megabytes", "rss_mb", "gauge", "Resident set size of the process in MB."),
+    ("relex_eta_seconds", "eta_sec", "gauge", "Estimated seconds until the stage finishes."),
+    ("relex_idle_seconds", "idle_sec", "gauge", "Seconds since the stage last reported progress."),
+]
+
+# every reporter's latest snapshot per metrics file, so stages sharing a
+# Prometheus textfile are written together instead of overwriting each other
+_PROM_SNAPSHOTS = {}
+_WRITE_LOCK = threading.Lock()
+
+
+def _write_prometheus(path, snap):
+    with _WRITE_LOCK:
+        stages = _PROM_SNAPSHOTS.setdefault(path, {})
+        stages[snap["stage"]] = snap
+        lines = []
+        for name, key, kind, help_text in PROM_METRICS:
+            samples = [(stage, s[key]) for stage, s in sorted(stages.items()) if s[key] is not None]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{stage="{stage}"}} {value}' for stage, value in samples)
+        # Textfile collectors read the whole file, so write to a temp file and swap.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _append_jsonl(path, snap):
+    with _WRITE_LOCK:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snap) + "\n")
+
+
+# ========== 3. Progress reporter ==========
+class ProgressReporter:
+    """
+    Throughput / ETA telemetry for a long loop.
+    Call update() once per unit of work. A timer thread prints a snapshot
+    every `interval` seconds and writes it to the metrics file, even when
+    the loop is stuck (idle_sec then keeps growing). The file is either
+    appended as JSON lines (fmt="jsonl") or rewritten as a Prometheus
+    textfile (fmt="prom") holding the latest snapshot of every stage that
+    reports to it.
+    """
+
+    def __init__(self, stage, total, unit="sentences", interval=10.0,
+                 metrics_path="results/metrics.jsonl", fmt="jsonl"):
+        if fmt not in ("jsonl", "prom"):
+            raise ValueError(f"Unknown metrics format: {fmt}")
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.metrics_path = metrics_path
+        self.fmt = fmt
+
+        self.done = 0
+        self.tokens = 0
+        self.relations = 0
+        self.kb_hits = 0
+        self.kb_lookups = 0
+
+        self.start = time.perf_counter()
+        self._last_update = self.start
+        if metrics_path:
+            os.makedirs(os.path.dirname(metrics_path) or ".", exist_ok=True)
+
+        self._stopped = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, name=f"telemetry-{stage}", daemon=True)
+        self._timer.start()
+
+    def _run_timer(self):
+        while not self._stopped.wait(self.interval):
+            self.emit()
+
+    def update(self, units=1, tokens=0, relations=0, kb_hits=0, kb_lookups=0):
+        self.done += units
+        self.tokens += tokens
+        self.relations += relations
+        self.kb_hits += kb_hits
+        self.kb_lookups += kb_lookups
+        self._last_update = time.perf_counter()
+
+    def snapshot(self):
+        now = time.perf_counter()
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate and self.total else None
+        return {
+            "ts": round(time.time(), 3),
+            "stage": self.stage,
+            "unit": self.unit,
+            "done": self.done,
+            "total": self.total,
+            "elapsed_sec": round(elapsed, 3),
+            "units_per_sec": round(rate, 3),
+            "tokens_per_sec": round(self.tokens / elapsed, 1) if elapsed else 0.0,
+            "relations": self.relations,
+            "kb_hit_rate": round(self.kb_hits / self.kb_lookups, 4) if self.kb_lookups else None,
+            "rss_mb": round(_rss_mb(), 1),
+            "eta_sec": round(remaining, 1) if remaining is not None else None,
+            "idle_sec": round(now - self._last_update, 1),
+        }
+
+    def emit(self):
+        snap = self.snapshot()
+        hit = f"{snap['kb_hit_rate']:.0%}" if snap["kb_hit_rate"] is not None else "--"
+        print(f" [{self.stage}] {snap['done']}/{snap['total']} {self.unit}"
+              f" | {snap['units_per_sec']:.1f} {self.unit}/s"
+              f" | {snap['tokens_per_sec']:.0f} tok/s"
+              f" | rel {snap['relations']} | KB hit {hit}"
+              f" | RSS {snap['rss_mb']:.0f} MB | ETA {_format_eta(snap['eta_sec'])}"
+              f" | idle {snap['idle_sec']:.0f}s")
+
+        if not self.metrics_path:
+            return snap
+        if self.fmt == "jsonl":
+            _append_jsonl(self.metrics_path, snap)
+        else:
+            _write_prometheus(self.metrics_path, snap)
+        return snap
+
+    def close(self):
+        """Stop the timer and emit a final snapshot regardless of the interval."""
+        self._stopped.set()
+        if self._timer is not threading.current_thread():
+            self._timer.join()
+        return self.emit()
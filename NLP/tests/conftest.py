@@ -0,0 +1,13 @@
+import os, sys
+
+import pytest
+
+
+NLP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NLP_DIR)
+
+
+@pytest.fixture(autouse=True)
+def in_nlp_dir(monkeypatch):
+    # the modules open their data files (relation_lexicon.json ...) by relative path
+    monkeypatch.chdir(NLP_DIR)
@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from book_store import BookStore, CHAPTER_PATTERN
+
+
+BOOK = (
+    "The Project’s front matter, with an accented café.\n"
+    "CHAPTER I.\n\n"
+    "It is a truth universally acknowledged, that a single man in possession\n"
+    "of a good fortune, must be in want of a wife.\n"
+    "short line\n"
+    "CHAPTER II.\n\n"
+    "“My dear Mr. Bennet,” said his lady to him one day, “have you heard?”\n"
+    "Mr. Bennet replied that he had not—naïvely, some would say.\n"
+)
+
+
+def legacy_segments(text, by):
+    """(start, text) of every segment as main3's old divide_text_by cut them."""
+    if by == "chapter":
+        pieces = re.split(CHAPTER_PATTERN, text)
+        separators = [m.group() for m in re.finditer(CHAPTER_PATTERN, text)] + [""]
+    else:
+        pieces = text.split("\n")
+        separators = ["\n"] * len(pieces)
+    segments, pos = [], 0
+    for piece, sep in zip(pieces, separators):
+        if by == "chapter" or len(piece.strip()) > 30:
+            segments.append((pos, piece))
+        pos += len(piece) + len(sep)
+    return segments
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_text(BOOK, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("by", ["chapter", "paragraph"])
+def test_chunks_match_legacy_split(book_path, by):
+    store = BookStore(book_path)
+    assert store.chunks(by) == legacy_segments(BOOK, by)
+
+
+@pytest.mark.parametrize("by", ["chapter", "paragraph"])
+def test_locate_matches_legacy_segments(book_path, by):
+    store = BookStore(book_path)
+    expected = np.full(len(BOOK) + 1, -1)
+    for i, (start, text) in enumerate(legacy_segments(BOOK, by)):
+        expected[start:start + len(text)] = i
+    assert store.locate(by, np.arange(len(BOOK) + 1)).tolist() == expected.tolist()
+
+
+def test_slice_uses_character_offsets(book_path):
+    store = BookStore(book_path)
+    assert store.book.n_chars == len(BOOK)
+    rng = np.random.default_rng(0)
+    for start, end in np.sort(rng.integers(0, len(BOOK) + 1, size=(200, 2)), axis=1):
+        assert store.slice(start, end) == BOOK[start:end]
+
+
+def test_index_is_reused_and_rebuilt_when_stale(book_path, capsys):
+    BookStore(book_path).book.close()
+    capsys.readouterr()
+
+    store = BookStore(book_path)
+    assert "Building offset index" not in capsys.readouterr().out
+    store.book.close()
+
+    changed = BOOK.replace("CHAPTER II.", "CHAPTER II.\n\nA new paragraph that is long enough to count.")
+    with open(book_path, "w", encoding="utf-8") as f:
+        f.write(changed)
+    store = BookStore(book_path)
+    assert "rebuilding" in capsys.readouterr().out
+    assert store.chunks("paragraph") == legacy_segments(changed, "paragraph")
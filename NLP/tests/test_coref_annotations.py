@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("numpy")
+spacy = pytest.importorskip("spacy")
+from spacy.tokens import Span
+
+from coref_annotations import CorefAnnotations, save_annotations
+
+
+TEXT = "Elizabeth smiled. She loved her sister Jane."
+
+
+def mention(word, occurrence=0):
+    start = -1
+    for _ in range(occurrence + 1):
+        start = TEXT.index(word, start + 1)
+    return start, start + len(word)
+
+
+@pytest.fixture
+def annotations(tmp_path):
+    clusters = [
+        {"qid": "Q1", "name": "Elizabeth Bennet",
+         "mentions": [mention("Elizabeth") + (0,), mention("She") + (0,), mention("her") + (1,)]},
+        # a cluster the KB could not link is stored but never applied
+        {"qid": None, "name": None, "mentions": [mention("Jane") + (0,)]},
+    ]
+    path = str(tmp_path / "coref.npz")
+    save_annotations(clusters, path)
+    return CorefAnnotations(path)
+
+
+@pytest.fixture
+def nlp():
+    return spacy.blank("en")
+
+
+def test_apply_marks_linked_mentions(annotations, nlp):
+    doc = nlp(TEXT)
+    assert annotations.apply(doc) == 3
+    assert [(e.text, e.label_, e.kb_id_) for e in doc.ents] == [
+        ("Elizabeth", "PERSON", "Q1"), ("She", "PERSON", "Q1"), ("her", "PERSON", "Q1")]
+    # the names the old resolved_book.txt rewrite put in place of the pronouns
+    assert [annotations.text_of(e) for e in doc.ents] == ["Elizabeth Bennet"] * 3
+
+
+def test_apply_uses_book_offsets(annotations, nlp):
+    base = TEXT.index("She")
+    doc = nlp(TEXT[base:])
+    assert annotations.apply(doc, base=base) == 2
+    assert [(e.text, e.kb_id_) for e in doc.ents] == [("She", "Q1"), ("her", "Q1")]
+
+
+def test_existing_entities_win(annotations, nlp):
+    doc = nlp(TEXT)
+    doc.ents = [Span(doc, 3, 4, label="ORG")]  # "She"
+    assert annotations.apply(doc) == 2
+    assert [(e.text, e.label_) for e in doc.ents] == [
+        ("Elizabeth", "PERSON"), ("She", "ORG"), ("her", "PERSON")]
+
+
+def test_mentions_between(annotations):
+    start, end = mention("She")[0], len(TEXT)
+    assert len(annotations) == 4
+    assert annotations.mentions_between(start, end).tolist() == [1, 2, 3]
@@ -0,0 +1,86 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from graph_store import GMLWriter, GraphMLWriter, CorpusGraph, export_graph
+
+
+FIRST = dict(ids=[0, 1], name=["Q1", "Q2"], label=["Elizabeth Bennet", "Jane Bennet"])
+FIRST_EDGES = dict(src=[0], dst=[1], relationship=["sister"], weight=[3.0])
+SECOND = dict(ids=[2], name=["Q3"], label=["Charlotte Lucas"])
+SECOND_EDGES = dict(src=[0], dst=[2], relationship=["friend"], weight=[1.0])
+
+
+def write(writer, nodes, edges):
+    nodes, edges = dict(nodes), dict(edges)
+    writer.write_nodes(nodes.pop("ids"), **nodes)
+    writer.write_edges(edges.pop("src"), edges.pop("dst"), **edges)
+
+
+@pytest.mark.parametrize("writer_cls", [GMLWriter, GraphMLWriter])
+def test_append_equals_single_write(tmp_path, writer_cls):
+    appended, whole = str(tmp_path / "appended"), str(tmp_path / "whole")
+    with writer_cls(appended) as w:
+        write(w, FIRST, FIRST_EDGES)
+    with writer_cls(appended, append=True) as w:
+        write(w, SECOND, SECOND_EDGES)
+    with writer_cls(whole) as w:
+        write(w, FIRST, FIRST_EDGES)
+        write(w, SECOND, SECOND_EDGES)
+    with open(appended, "rb") as a, open(whole, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_append_refuses_a_file_without_footer(tmp_path):
+    path = tmp_path / "broken.gml"
+    path.write_text(GMLWriter.HEADER + "  node\n  [\n    id 0\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        GMLWriter(str(path), append=True)
+
+
+def _contents(g):
+    """Sorted (name, label) nodes and (names, relationship, weight) edges of an igraph graph."""
+    edges = sorted((tuple(sorted((g.vs[e.source]["name"], g.vs[e.target]["name"]))),
+                    e["relationship"], float(e["weight"])) for e in g.es)
+    return sorted(zip(g.vs["name"], g.vs["label"])), edges
+
+
+def _read_gml(path):
+    ig = pytest.importorskip("igraph")
+    return _contents(ig.Graph.Read_GML(path))
+
+
+def test_streamed_gml_reads_like_igraph_write_gml(tmp_path):
+    ig = pytest.importorskip("igraph")
+    names = FIRST["name"] + SECOND["name"]
+    labels = FIRST["label"] + SECOND["label"]
+    src, dst = [0, 0], [1, 2]
+    relationship, weight = ["sister", "friend"], [3.0, 1.0]
+
+    # the legacy export: build the igraph graph and let it serialise itself
+    g = ig.Graph(n=len(names), edges=list(zip(src, dst)), directed=False)
+    g.vs["name"], g.vs["label"] = names, labels
+    g.es["relationship"], g.es["weight"] = relationship, weight
+    legacy = str(tmp_path / "legacy.gml")
+    g.write_gml(legacy)
+
+    streamed, = export_graph(str(tmp_path / "streamed"), names, src, dst,
+                             node_attrs={"label": labels},
+                             edge_attrs={"relationship": relationship, "weight": weight},
+                             formats=(".gml",))
+    assert _read_gml(streamed) == _read_gml(legacy)
+
+
+def test_corpus_gml_matches_edge_records(tmp_path):
+    pytest.importorskip("igraph")
+    corpus = CorpusGraph(str(tmp_path / "corpus"))
+    corpus.append_book("pride", ["Q1", "Q1"], ["Q2", "Q3"], ["sister", "friend"], [3, 1],
+                       labels={"Q1": "Elizabeth", "Q2": "Jane", "Q3": "Charlotte"})
+    corpus.append_book("emma", ["Q4", "Q1"], ["Q5", "Q4"], ["friend", "cousin"], [2, 1],
+                       labels={"Q4": "Emma", "Q5": "Harriet"})
+
+    reopened = CorpusGraph(str(tmp_path / "corpus"))
+    assert reopened.nodes.values == ["Q1", "Q2", "Q3", "Q4", "Q5"]
+    assert reopened.edges()["book"].tolist() == [0, 0, 1, 1]
+
+    assert _read_gml(str(tmp_path / "corpus" / "corpus.gml")) == _contents(reopened.to_igraph())
@@ -0,0 +1,49 @@
+import pytest
+
+from pipeline import run_stages
+
+
+def double(items):
+    for x in items:
+        yield 2 * x
+
+
+def increment(items):
+    for x in items:
+        yield x + 1
+
+
+def counting_source(n, produced):
+    for i in range(n):
+        produced.append(i)
+        yield i
+
+
+def test_outputs_match_sequential_run():
+    out = list(run_stages(range(500), [("double", double), ("increment", increment)], maxsize=4))
+    assert out == [2 * x + 1 for x in range(500)]
+
+
+def test_stage_error_cancels_source_and_is_raised():
+    produced = []
+
+    def fail_at_50(items):
+        for x in items:
+            if x == 50:
+                raise ValueError("boom")
+            yield x
+
+    with pytest.raises(RuntimeError) as info:
+        list(run_stages(counting_source(100_000, produced), [("fail", fail_at_50)], maxsize=4))
+    assert isinstance(info.value.__cause__, ValueError)
+    assert len(produced) < 1000
+
+
+def test_early_exit_cancels_all_stages():
+    produced = []
+    stream = run_stages(counting_source(100_000, produced),
+                        [("double", double), ("increment", increment)], maxsize=4)
+    first = [next(stream) for _ in range(10)]
+    stream.close()  # joins every stage thread
+    assert first == [2 * x + 1 for x in range(10)]
+    assert len(produced) < 1000
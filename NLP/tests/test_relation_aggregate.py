@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from relation_aggregate import RelationAggregator
+from relation_offsets import OFFSET_COLUMNS
+
+
+COLUMNS = ["Relationship", "Entity1", "Entity2", "Entity1_ID", "Entity2_ID", "Mode", "Source"]
+ROWS = [
+    ("friend", "Jane Bennet", "Elizabeth Bennet", "Q3", "Q1", "sentence", "main1"),
+    ("friends", "Elizabeth Bennet", "Jane Bennet", "Q1", "Q3", "sentence", "main1"),
+    ("sister", "Elizabeth Bennet", "Jane Bennet", "Q1", "Q3", "100token", "main2"),
+    ("sisters", "Jane Bennet", "Elizabeth Bennet", "Q3", "Q1", "100token", "main2"),
+    ("wife", "Charlotte Lucas", "Mr. Collins", "Q2", "Q4", "sentence", "main1"),
+]
+
+
+def rows():
+    return [dict(zip(COLUMNS, row)) for row in ROWS]
+
+
+def offsets():
+    return np.arange(len(ROWS) * len(OFFSET_COLUMNS), dtype=np.int32).reshape(len(ROWS), -1)
+
+
+def test_counts_are_canonical_and_symmetric_pairs_sorted():
+    aggregator = RelationAggregator()
+    for row in rows():
+        aggregator.add(row)
+    assert aggregator.counts == {
+        (("Q1", "Elizabeth Bennet"), "friend", ("Q3", "Jane Bennet"), "sentence", "main1"): 2,
+        (("Q1", "Elizabeth Bennet"), "sister", ("Q3", "Jane Bennet"), "100token", "main2"): 1,
+        (("Q3", "Jane Bennet"), "sister", ("Q1", "Elizabeth Bennet"), "100token", "main2"): 1,
+        (("Q2", "Charlotte Lucas"), "wife", ("Q4", "Mr. Collins"), "sentence", "main1"): 1,
+    }
+
+
+def test_add_frame_matches_add():
+    one_by_one = RelationAggregator(keep_evidence=True)
+    for row, offs in zip(rows(), offsets()):
+        one_by_one.add(row, tuple(offs))
+    framed = RelationAggregator(keep_evidence=True)
+    frame = pd.DataFrame(rows(), columns=COLUMNS).astype("category")
+    framed.add_frame(frame, offsets())
+
+    assert framed.counts == one_by_one.counts
+    # equal counts keep insertion order, which may differ between the two
+    key = ["Entity1_ID", "Relationship", "Entity2_ID", "Mode", "Source"]
+    assert (framed.to_frame().sort_values(key).reset_index(drop=True)
+            .equals(one_by_one.to_frame().sort_values(key).reset_index(drop=True)))
+    assert framed.evidence_frame(COLUMNS).astype(str).equals(one_by_one.evidence_frame(COLUMNS))
+    assert np.array_equal(framed.evidence_offsets_array(), one_by_one.evidence_offsets_array())
+
+
+def test_write_evidence(tmp_path):
+    aggregator = RelationAggregator(keep_evidence=True)
+    aggregator.add_frame(pd.DataFrame(rows(), columns=COLUMNS), offsets())
+    csv_path, offsets_path = tmp_path / "raw.csv", tmp_path / "raw.npy"
+    aggregator.write_evidence(str(csv_path), str(offsets_path), COLUMNS)
+    assert pd.read_csv(csv_path).values.tolist() == [list(row) for row in ROWS]
+    assert np.array_equal(np.load(offsets_path), offsets())
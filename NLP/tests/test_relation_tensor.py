@@ -0,0 +1,96 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+# post_process_updated draws with igraph / matplotlib
+pytest.importorskip("igraph")
+pytest.importorskip("matplotlib")
+
+from post_process_updated import summarize_relationships, format_pairs
+from relation_tensor import RelationTensor
+
+
+NAMES = {"Q1": "Elizabeth Bennet", "Q2": "Charlotte Lucas", "Q3": "Jane Bennet", "Q4": "Mr. Collins"}
+ROWS = [
+    ("friend", "Q2", "Q1"), ("friends", "Q1", "Q2"), ("Sister", "Q1", "Q3"),
+    ("sisters", "Q3", "Q1"), ("sister", "Q1", "Q3"), ("wife", "Q4", "Q2"),
+    ("husband", "Q2", "Q4"), ("wife", "Q4", "Q2"),
+    ("daughter", "N/A", "Q1"),   # one side not linked to the KB
+    ("friend", "Q1", "Q1"),      # self pair, dropped
+    ("father", "N/A", "N/A"),    # dropped the same way
+]
+
+
+def raw_relations():
+    return pd.DataFrame(ROWS, columns=["Relationship", "Entity1_ID", "Entity2_ID"])
+
+
+def legacy_process_data(df, name_dict):
+    """The counts table and pivot of the original post_process_updated.process_data."""
+    df = df.dropna(subset=["Entity1_ID", "Entity2_ID", "Relationship"]).copy()
+    df["Entity1_ID"] = df["Entity1_ID"].astype(str).str.strip()
+    df["Entity2_ID"] = df["Entity2_ID"].astype(str).str.strip()
+    df = df[df["Entity1_ID"] != df["Entity2_ID"]].copy()
+    mapping = {"friends": "friend", "daughters": "daughter", "sons": "son", "brothers": "brother",
+               "sisters": "sister", "parents": "parent", "couples": "couple", "wives": "wife",
+               "husbands": "husband", "fathers": "father", "mothers": "mother"}
+    df["Relationship"] = df["Relationship"].map(lambda r: mapping.get(r.lower().strip(), r.lower().strip()))
+    df["sorted_pair"] = df.apply(lambda r: tuple(sorted([r["Entity1_ID"], r["Entity2_ID"]])), axis=1)
+
+    rel_type_counts = df.groupby(["sorted_pair", "Relationship"]).size().reset_index(name="relationship_type_count")
+    total_counts = df.groupby("sorted_pair").size().reset_index(name="total_relationship_count")
+    unique_counts = df.groupby("sorted_pair")["Relationship"].nunique().reset_index(name="unique_relationship_types")
+    out = rel_type_counts.merge(total_counts, on="sorted_pair", how="left")
+    out = out.merge(unique_counts, on="sorted_pair", how="left")
+    out[["Entity1_ID", "Entity2_ID"]] = out["sorted_pair"].apply(lambda x: pd.Series(x))
+    out["Entity1"] = out["Entity1_ID"].map(name_dict)
+    out["Entity2"] = out["Entity2_ID"].map(name_dict)
+
+    pivot = df.pivot_table(index="sorted_pair", columns="Relationship", values="Entity1_ID",
+                           aggfunc="count", fill_value=0).reset_index()
+    return out, pivot
+
+
+def test_summary_matches_legacy_csvs():
+    tensor, out, pivot = summarize_relationships(raw_relations(), NAMES)
+    legacy_out, legacy_pivot = legacy_process_data(raw_relations(), NAMES)
+    assert out.to_csv(index=False) == legacy_out.to_csv(index=False)
+    assert pivot.to_csv(index=False) == legacy_pivot.to_csv(index=False)
+    assert tensor.counts.sum() == len(ROWS) - 2
+
+
+def test_dominant_relation_matches_legacy_idxmax():
+    tensor, _, _ = summarize_relationships(raw_relations(), NAMES)
+    _, legacy_pivot = legacy_process_data(raw_relations(), NAMES)
+    relation_cols = legacy_pivot.columns[1:]
+
+    e1, e2, rel, strength = tensor.dominant_relation()
+    qids = np.asarray(tensor.qids, dtype=object)
+    relations = np.asarray(tensor.relations, dtype=object)
+    assert format_pairs(qids[e1], qids[e2]).tolist() == legacy_pivot["sorted_pair"].map(str).tolist()
+    assert relations[rel].tolist() == legacy_pivot[relation_cols].idxmax(axis=1).tolist()
+    assert strength.tolist() == legacy_pivot[relation_cols].max(axis=1).tolist()
+
+
+def test_save_load_round_trip(tmp_path):
+    tensor, _, _ = summarize_relationships(raw_relations(), NAMES)
+    path = str(tmp_path / "tensor.npz")
+    tensor.save(path)
+    loaded = RelationTensor.load(path)
+
+    for name in ("e1", "e2", "rel", "counts"):
+        assert np.array_equal(getattr(loaded, name), getattr(tensor, name))
+    assert loaded.qids == tensor.qids
+    assert loaded.relations == tensor.relations
+    assert loaded.shape == tensor.shape
+    assert loaded.to_pivot(format_pairs).equals(tensor.to_pivot(format_pairs))
+
+
+def test_relation_slice_and_marginals():
+    tensor, _, _ = summarize_relationships(raw_relations(), NAMES)
+    sister = tensor.relations.index("sister")
+    e1, e2, counts = tensor.relation_slice(sister)
+    assert [(tensor.qids[a], tensor.qids[b]) for a, b in zip(e1, e2)] == [("Q1", "Q3")]
+    assert counts.tolist() == [3]
+    assert tensor.relation_marginals()[sister] == 3
+    assert tensor.entity_marginals()[tensor.qids.index("Q1")] == 2 + 3 + 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+class StringTable:
+    """Bidirectional string <-> small int mapping. Unknown strings encode to -1."""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.index = {}
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        return self.index.get(value, -1)
+
+    def encode_array(self, values, grow=False):
+        """
+        Vectorised encode of a Series / array of strings: each distinct string
+        is looked up once (pd.factorize), then codes are gathered as ints.
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object).str.strip())
+        lookup = np.array(
+            [self.add(u) if grow else self.encode(u) for u in uniques] + [-1],
+            dtype=np.int32,
+        )
+        # factorize marks missing values with -1, which picks the trailing -1
+        return lookup[codes]
+
+    def decode(self, ids):
+        values = np.array(self.values + [None], dtype=object)
+        return values[np.asarray(ids)]
+
+    def categorical(self, ids):
+        """Strings for output as a pandas Categorical (no per-row string objects)."""
+        return pd.Categorical.from_codes(np.asarray(ids), categories=pd.Index(self.values))
+
+
+class Vocabulary:
+    """
+    Integer ids for the strings the post-processing works with: character
+    QIDs, relation types, modes and sources. QIDs are sorted so that
+    comparing ids orders pairs the same way as comparing the QID strings.
+    """
+
+    def __init__(self, qids=(), relations=(), modes=(), sources=()):
+        self.qids = StringTable(sorted(qids))
+        self.relations = StringTable(relations)
+        self.modes = StringTable(modes)
+        self.sources = StringTable(sources)
+
+    @classmethod
+    def from_kb(cls, kb, relations=(), extra_qids=()):
+        """
+        kb is the {qid: {...}} dict of load_knowledge_base, or a QID→Name dict.
+        extra_qids are ids seen in the data but not in the KB (e.g. "N/A" for
+        an unlinked entity); they are sorted in with the KB QIDs.
+        """
+        qids = {str(q).strip() for q in kb} | {str(q).strip() for q in extra_qids}
+        return cls(qids=qids, relations=relations)